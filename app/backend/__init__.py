@@ -3,6 +3,7 @@ from flask_session import Session
 import os
 import secrets
 import uuid
+from config import ENGINE_WARMUP
 
 def create_app():
     app = Flask(
@@ -24,14 +25,15 @@ def create_app():
     os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
     Session(app)
     
-    from app.backend.routes import chat_bp
+    from app.backend.routes import chat_bp, engine_registry
     app.register_blueprint(chat_bp)
     
-    # Load sample university data on startup
-    try:
-        from app.backend.utils import load_sample_data
-        load_sample_data()
-    except Exception as e:
-        print(f"Warning: Could not load sample data: {e}")
+    # Build the RAG engine (and the sample data it needs) now, in the background or on first use
+    if ENGINE_WARMUP == 'preload':
+        engine_registry.get()
+    elif ENGINE_WARMUP == 'background':
+        engine_registry.warm_up()
+    elif ENGINE_WARMUP != 'lazy':
+        raise ValueError(f"Unknown ENGINE_WARMUP: {ENGINE_WARMUP}")
     
-    return app
\ No newline at end of file
+    return app
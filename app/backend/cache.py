@@ -0,0 +1,90 @@
+# backend/cache.py
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Same tokens as the TfidfVectorizer defaults (lowercased words of 2+ characters)
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# Words that don't change what a question asks. Deliberately short: negations,
+# question words and prepositions like before/after all change the answer
+QUESTION_FILLER = frozenset([
+    'an', 'the', 'is', 'are', 'was', 'were', 'be', 'please', 'kindly', 'tell', 'me', 'about',
+    'can', 'could', 'would', 'you', 'know', 'want', 'like', 'hi', 'hello', 'hey', 'thanks',
+])
+
+
+def normalize_query(query):
+    """Canonical form of a query: its lowercased tokens, sorted.
+
+    TF-IDF ignores case, punctuation and word order, so queries that normalize
+    the same get the same vector and the same search results.
+    """
+    return " ".join(sorted(TOKEN_PATTERN.findall(query.lower())))
+
+
+def normalize_whitespace(query):
+    """A query with runs of whitespace collapsed, for scorers where case and word order matter"""
+    return " ".join(query.split())
+
+
+def normalize_question(question):
+    """Content words of a question, lowercased, in their original order.
+
+    Filler words are dropped, so "Can you tell me the fee refund policy?" and
+    "fee refund policy" ask the same thing. Unlike normalize_query the order is
+    kept: "transfer from CSE to ECE" is a different question from its reverse.
+    """
+    return " ".join(token for token in TOKEN_PATTERN.findall(question.lower()) if token not in QUESTION_FILLER)
+
+
+class LRUCache:
+    """Thread-safe bounded cache with least-recently-used eviction and an optional TTL"""
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it recently used, or default on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,176 @@
+# backend/chunking.py
+import re
+
+# Running page headers/footers ("Page 5 of 36", "1 | P a g e")
+PAGE_HEADER = re.compile(r"^\s*(?:Page\s+\d+\s+of\s+\d+|\d+\s*\|\s*P\s*a\s*g\s*e)\s*", re.IGNORECASE)
+
+# Lines opening a numbered clause, a lettered/roman sub-clause or a bullet
+CLAUSE_START = re.compile(r"\s*(?:•|\(?[a-z]\)|\(?[ivx]+\)|\d+(?:\.\d+)*\.?\s)")
+
+# Bullets and lettered/roman sub-clauses, which are never headings
+LIST_ITEM = re.compile(r"\s*(?:•|\(?[a-z]\)|\(?[ivx]+\))")
+
+# Top-level and section clauses ("5.", "5.2", "13.1.") that start a new chunk when possible
+SECTION_START = re.compile(r"\s*\d+(?:\.\d+)?\.?\s")
+
+# End of a sentence, not after common abbreviations, degrees ("M.Sc.") or initials
+SENTENCE_END = re.compile(r"(?<!\bDr\.)(?<!\bMr\.)(?<!\bMs\.)(?<!\bNo\.)(?<!\bSr\.)(?<!\bSc\.)(?<!\b[A-Z]\.)(?<=[.!?])\s+(?=[A-Z(•“\"])")
+
+HEADING_MAX_WORDS = 8
+
+
+def _spans(text, pattern, start, end):
+    """Split text[start:end] at the matches of pattern, as (start, end) spans without the separators"""
+    spans = []
+    for match in pattern.finditer(text, start, end):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, end))
+    return spans
+
+
+def _units(pages):
+    """Split page texts into units: headings, clause openings and sentences.
+
+    Each unit is a dict with its page (0-based), character span within that
+    page, whitespace-normalized text, word count and whether it is a heading
+    or opens a section.
+    """
+    units = []
+    for page, page_text in enumerate(pages):
+        header = PAGE_HEADER.match(page_text)
+        offset = header.end() if header else 0
+
+        # Blocks are runs of lines between blank lines, also broken before clauses and bullets
+        blocks = []
+        block_start = None
+        line_start = offset
+        for line in page_text[offset:].split('\n'):
+            line_end = line_start + len(line)
+            if not line.strip() or CLAUSE_START.match(line):
+                if block_start is not None:
+                    blocks.append((block_start, line_start))
+                block_start = line_start if line.strip() else None
+            elif block_start is None:
+                block_start = line_start
+            line_start = line_end + 1
+        if block_start is not None:
+            blocks.append((block_start, len(page_text)))
+
+        for block_start, block_end in blocks:
+            block = page_text[block_start:block_end]
+            single_line = '\n' not in block.strip()
+            for start, end in _spans(page_text, SENTENCE_END, block_start, block_end):
+                words = page_text[start:end].split()
+                if not words:
+                    continue
+                # Trim the span to its first and last word
+                start = page_text.index(words[0], start)
+                end = page_text.rindex(words[-1], start, end) + len(words[-1])
+                text = " ".join(words)
+                units.append({
+                    'page': page,
+                    'start': start,
+                    'end': end,
+                    'text': text,
+                    'words': len(words),
+                    'heading': (single_line and len(words) <= HEADING_MAX_WORDS and not LIST_ITEM.match(text)
+                                and not text.endswith(('.', ',', ';', ':'))),
+                    'section': bool(SECTION_START.match(text)),
+                })
+    return units
+
+
+def _split_long(unit, max_words, pages):
+    """Split a unit longer than max_words into word windows"""
+    page_text = pages[unit['page']]
+    words = list(re.finditer(r"\S+", page_text[unit['start']:unit['end']]))
+    pieces = []
+    for i in range(0, len(words), max_words):
+        window = words[i:i + max_words]
+        pieces.append(dict(
+            unit,
+            start=unit['start'] + window[0].start(),
+            end=unit['start'] + window[-1].end(),
+            text=" ".join(word.group() for word in window),
+            words=len(window),
+            heading=False,
+            section=unit['section'] and i == 0,
+        ))
+    return pieces
+
+
+def _chunk(units):
+    return {
+        'text': " ".join(unit['text'] for unit in units),
+        'page_start': units[0]['page'] + 1,
+        'page_end': units[-1]['page'] + 1,
+        'char_start': units[0]['start'],
+        'char_end': units[-1]['end'],
+    }
+
+
+def structured_chunks(pages, max_words=200, min_words=40):
+    """Chunk a PDF's pages along its structure.
+
+    Chunks are built from whole sentences, clauses and headings, up to
+    max_words each; a new section or heading starts a new chunk once the
+    current one has min_words. Returns dicts with the chunk text, its first
+    and last page (1-based) and the character offsets of its start within the
+    first page and its end within the last page.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for unit in _units(pages):
+        for piece in (_split_long(unit, max_words, pages) if unit['words'] > max_words else [unit]):
+            if current and (piece['heading'] or piece['section']) and size >= min_words:
+                chunks.append(current)
+                current, size = [], 0
+            elif current and size + piece['words'] > max_words:
+                # A heading belongs with the text after it
+                carried = [current.pop()] if current[-1]['heading'] and len(current) > 1 else []
+                chunks.append(current)
+                current, size = carried, sum(unit['words'] for unit in carried)
+            current.append(piece)
+            size += piece['words']
+
+    if current:
+        # A short tail joins the previous chunk when that keeps it near max_words
+        if chunks and size < min_words and sum(unit['words'] for unit in chunks[-1]) + size <= max_words + min_words:
+            chunks[-1].extend(current)
+        else:
+            chunks.append(current)
+    return [_chunk(units) for units in chunks]
+
+
+def word_chunks(pages, chunk_size=1000, overlap=200):
+    """Fixed windows of chunk_size words, each overlapping the previous by `overlap` words.
+
+    The original chunker, kept for comparison; returns the same dicts as
+    structured_chunks.
+    """
+    words = [
+        {'page': page, 'start': match.start(), 'end': match.end(), 'text': match.group()}
+        for page, page_text in enumerate(pages)
+        for match in re.finditer(r"\S+", page_text)
+    ]
+    if not words:
+        return []
+    if len(words) <= chunk_size:
+        return [_chunk(words)]
+    chunks = []
+    i = 0
+    while i < len(words):
+        chunks.append(_chunk(words[i:i + chunk_size]))
+        i += chunk_size - overlap
+    return chunks
+
+
+def chunk_pages(pages, chunker='structured', max_words=200, min_words=40):
+    """Chunk a PDF's page texts with the configured chunker"""
+    if chunker == 'structured':
+        return structured_chunks(pages, max_words, min_words)
+    if chunker == 'words':
+        return word_chunks(pages)
+    raise ValueError(f"Unknown chunker: {chunker}")
@@ -0,0 +1,127 @@
+# backend/context.py
+import re
+from bisect import bisect_right
+from app.backend.cache import TOKEN_PATTERN, QUESTION_FILLER
+from app.backend.chunking import SENTENCE_END
+
+# Line breaks and bullets (headings and list items in extracted PDF text)
+LINE_BREAK = re.compile(r"\n+|\s+(?=•)")
+
+# A sentence is cut down to what is left of a passage's budget, unless that is less than this
+MIN_TRIMMED_TOKENS = 20
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def split_sentences(text):
+    """Sentences, headings and list items, split like the chunker does so "M.Sc." or "Sr. No." don't end one"""
+    return [
+        sentence.strip()
+        for line in LINE_BREAK.split(text)
+        for sentence in SENTENCE_END.split(line)
+        if sentence.strip()
+    ]
+
+
+def trim_to_tokens(text, budget):
+    """Cut text to roughly `budget` tokens at a word boundary"""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[:budget * 4].rsplit(" ", 1)[0]
+    return cut + " ..."
+
+
+def trim_around(text, terms, budget):
+    """Cut text to roughly `budget` tokens around the stretch mentioning the most of `terms`.
+
+    For sentences too long to keep whole, such as a fee table extracted as one
+    run-on sentence, where the row a question asks about may be anywhere.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    width = budget * 4
+    matches = [(m.start(), m.group()) for m in TOKEN_PATTERN.finditer(text.lower()) if m.group() in terms]
+    start = 0
+    if matches:
+        positions = [position for position, _ in matches]
+        ends = [bisect_right(positions, position + width) for position in positions]
+        best = max(range(len(matches)), key=lambda i: (len({term for _, term in matches[i:ends[i]]}), ends[i] - i))
+        # Start a little before that stretch, at a word boundary
+        start = max(positions[best] - width // 8, 0)
+        start = text.rfind(" ", 0, start) + 1 if start else 0
+    if start == 0:
+        return trim_to_tokens(text, budget)
+    return "... " + trim_to_tokens(text[start:], budget - 1)
+
+
+class ContextBuilder:
+    """Packs retrieved passages into a prompt context of at most `token_budget` tokens.
+
+    Hits are taken best first and trimmed to their sentences sharing the most
+    words with the question, each with `window` neighbouring sentences to keep
+    it readable; no hit takes more than half the budget, and a sentence too
+    long for what is left of it is cut around the question's words. Sentences already
+    used, such as the 200-word overlap between neighbouring chunks of a PDF,
+    are not repeated.
+    """
+
+    def __init__(self, token_budget=1200, window=1):
+        self.token_budget = token_budget
+        self.window = window
+
+    def build(self, query, hits):
+        """Return (passages, stats); each passage is a hit with the `text` to show for it"""
+        query_terms = {term for term in TOKEN_PATTERN.findall(query.lower()) if term not in QUESTION_FILLER}
+        seen = set()
+        passages = []
+        used = 0
+        duplicates = 0
+
+        for hit in sorted(hits, key=lambda hit: -hit['similarity']):
+            if used >= self.token_budget:
+                break
+            sentences = split_sentences(hit['document']['content'])
+            keys = [" ".join(TOKEN_PATTERN.findall(sentence.lower())) for sentence in sentences]
+            passage_budget = min(self.token_budget - used, self.token_budget // 2)
+
+            # Sentences by how many query terms they mention (the opening one if
+            # none does: the match was on the title), each with its neighbours
+            overlap = [len(query_terms & set(key.split())) for key in keys]
+            ranked = sorted((i for i in range(len(sentences)) if overlap[i]), key=lambda i: -overlap[i]) or [0]
+            keep = {}
+            repeated = set()
+            cost = 0
+            for center in ranked:
+                for i in range(max(center - self.window, 0), min(center + self.window + 1, len(sentences))):
+                    if i in keep:
+                        continue
+                    if keys[i] in seen:
+                        repeated.add(i)
+                        continue
+                    sentence = sentences[i]
+                    if cost + estimate_tokens(sentence) + 1 > passage_budget:
+                        if passage_budget - cost - 1 < MIN_TRIMMED_TOKENS:
+                            continue
+                        sentence = trim_around(sentence, query_terms, passage_budget - cost - 1)
+                    keep[i] = sentence
+                    seen.add(keys[i])
+                    cost += estimate_tokens(sentence) + 1
+
+            duplicates += len(repeated)
+
+            # Back in document order, marking the gaps left by skipped sentences
+            text = ""
+            last = None
+            for i in sorted(keep):
+                text += keep[i] if last is None else (" " if i == last + 1 else " ... ") + keep[i]
+                last = i
+            if text:
+                passages.append(dict(hit, text=text))
+                used += cost
+
+        stats = {'passages': len(passages), 'hits': len(hits), 'context_tokens': used,
+                 'duplicate_sentences': duplicates}
+        return passages, stats
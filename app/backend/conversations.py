@@ -0,0 +1,204 @@
+# backend/conversations.py
+import os
+import time
+import threading
+from collections import deque
+from app.backend.utils import SQLiteConnections
+
+
+def turn(sender, text):
+    """A stored conversation turn: who said it and the raw text (markdown for the bot, never HTML)"""
+    return {'sender': sender, 'text': text}
+
+
+class ConversationStore:
+    """Interface for chat history backends.
+
+    Each conversation keeps only its last `max_turns` turns (what the prompt
+    and the page need) and is dropped once idle for `ttl` seconds.
+    """
+
+    def __init__(self, max_turns=10, ttl=86400, gc_interval=300):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.gc_interval = gc_interval
+        self._last_gc = time.monotonic()
+
+    def get(self, session_id):
+        """Return the stored turns of a conversation, oldest first"""
+        raise NotImplementedError
+
+    def append(self, session_id, *turns):
+        """Add turns to a conversation, dropping the oldest beyond max_turns"""
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        raise NotImplementedError
+
+    def gc(self):
+        """Remove conversations idle for longer than ttl; returns how many were removed"""
+        raise NotImplementedError
+
+    def _maybe_gc(self):
+        """Run gc at most every gc_interval seconds, from whichever request gets there first"""
+        if time.monotonic() - self._last_gc < self.gc_interval:
+            return
+        self._last_gc = time.monotonic()
+        removed = self.gc()
+        if removed:
+            print(f"Removed {removed} expired conversations")
+
+
+class SessionConversationStore(ConversationStore):
+    """History inside the Flask session (the original behaviour), bounded and without the HTML copies.
+
+    Expiry is left to the session backend.
+    """
+
+    def get(self, session_id):
+        from flask import session
+        return list(session.get('chat_history', []))
+
+    def append(self, session_id, *turns):
+        from flask import session
+        session['chat_history'] = (session.get('chat_history', []) + list(turns))[-self.max_turns:]
+
+    def clear(self, session_id):
+        from flask import session
+        session['chat_history'] = []
+
+    def gc(self):
+        return 0
+
+
+class MemoryConversationStore(ConversationStore):
+    """Per-process ring buffers; only for a single worker process, as other workers can't see them"""
+
+    def __init__(self, max_turns=10, ttl=86400, gc_interval=300):
+        super().__init__(max_turns, ttl, gc_interval)
+        self._conversations = {}  # session_id -> (last_used, deque of turns)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._conversations.get(session_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return []
+            return list(entry[1])
+
+    def append(self, session_id, *turns):
+        with self._lock:
+            entry = self._conversations.get(session_id)
+            expired = entry is None or time.monotonic() - entry[0] > self.ttl
+            buffer = deque(maxlen=self.max_turns) if expired else entry[1]
+            buffer.extend(turns)
+            self._conversations[session_id] = (time.monotonic(), buffer)
+        self._maybe_gc()
+
+    def clear(self, session_id):
+        with self._lock:
+            self._conversations.pop(session_id, None)
+
+    def gc(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [session_id for session_id, (last_used, _) in self._conversations.items() if last_used < cutoff]
+            for session_id in expired:
+                del self._conversations[session_id]
+        return len(expired)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite (WAL mode) backend shared by all worker processes; one small write per turn"""
+
+    def __init__(self, path, max_turns=10, ttl=86400, gc_interval=300):
+        super().__init__(max_turns, ttl, gc_interval)
+        self.path = path
+        self._connections = SQLiteConnections(path)
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                " session_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " sender TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, seq))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " session_id TEXT PRIMARY KEY,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS conversations_last_used ON conversations (last_used)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def get(self, session_id):
+        conn = self._connection()
+        last_used = conn.execute(
+            "SELECT last_used FROM conversations WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if last_used is None or time.time() - last_used[0] > self.ttl:
+            return []
+        rows = conn.execute(
+            "SELECT sender, text FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [turn(sender, text) for sender, text in rows]
+
+    def append(self, session_id, *turns):
+        conn = self._connection()
+        with conn:
+            # Take the write lock first so concurrent appends number their turns in turn
+            conn.execute("BEGIN IMMEDIATE")
+            # An expired conversation not yet collected starts over
+            last_used = conn.execute(
+                "SELECT last_used FROM conversations WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if last_used is not None and time.time() - last_used[0] > self.ttl:
+                conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            last = conn.execute("SELECT MAX(seq) FROM turns WHERE session_id = ?", (session_id,)).fetchone()[0]
+            last = -1 if last is None else last
+            conn.executemany(
+                "INSERT INTO turns (session_id, seq, sender, text) VALUES (?, ?, ?, ?)",
+                [(session_id, last + 1 + i, t['sender'], t['text']) for i, t in enumerate(turns)],
+            )
+            # Ring buffer: keep only the newest max_turns
+            conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND seq <= ?",
+                (session_id, last + len(turns) - self.max_turns),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO conversations (session_id, last_used) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+        self._maybe_gc()
+
+    def clear(self, session_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+
+    def gc(self):
+        conn = self._connection()
+        cutoff = time.time() - self.ttl
+        with conn:
+            conn.execute(
+                "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM conversations WHERE last_used < ?)",
+                (cutoff,),
+            )
+            return conn.execute("DELETE FROM conversations WHERE last_used < ?", (cutoff,)).rowcount
+
+
+def create_conversation_store(backend, path, max_turns=10, ttl=86400, gc_interval=300):
+    """Build the configured conversation store backend"""
+    if backend == 'sqlite':
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return SQLiteConversationStore(path, max_turns, ttl, gc_interval)
+    if backend == 'memory':
+        return MemoryConversationStore(max_turns, ttl, gc_interval)
+    if backend == 'session':
+        return SessionConversationStore(max_turns, ttl, gc_interval)
+    raise ValueError(f"Unknown conversation store backend: {backend}")
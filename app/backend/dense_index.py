@@ -0,0 +1,142 @@
+# backend/dense_index.py
+import time
+from collections import namedtuple
+import numpy as np
+from app.backend.dense_store import DenseVectorStore
+from app.backend.encoders import LSAEncoder, create_encoder
+from app.backend.retrieval import IVFIndex
+from app.backend.sparse_store import content_hash
+
+# What a dense search reads, swapped in as one object like the lexical IndexState
+DenseState = namedtuple('DenseState', ['encoder', 'ivf', 'tombstones'])
+
+
+class DenseIndex:
+    """Dense-vector index kept row for row in step with the lexical IncrementalIndex.
+
+    The engine fits, appends to and tombstones both indexes together, so a row
+    number means the same document in each and the snapshot's row_docs serve
+    both. Texts are encoded `batch_size` at a time through the embedding cache,
+    which skips chunks whose content was encoded before.
+
+    A full build refits a trainable encoder (LSA) and re-clusters the IVF
+    lists; the centroids are saved with the encoder, and on start-up the rows
+    are reassigned to them from cached vectors, with nothing to re-encode.
+    """
+
+    def __init__(self, directory, encoder='lsa', batch_size=64, threshold=0.3, ivf_min_rows=2000, nprobe=16):
+        self.store = DenseVectorStore(directory)
+        # Pretrained encoders are loaded once here, so a misconfigured one fails at start-up
+        self.encoder = create_encoder(encoder)
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.state = None
+
+    def n_lists(self, n_rows):
+        """IVF lists for a corpus of n_rows; 0 (exact search) below ivf_min_rows"""
+        return int(np.sqrt(n_rows)) if n_rows >= self.ivf_min_rows else 0
+
+    def fit(self, texts):
+        """Encode all texts as rows 0..n-1, refitting a trainable encoder first, and save the model"""
+        encoder = self.encoder
+        if encoder.trainable:
+            encoder = create_encoder(encoder.name)
+            vectors = encoder.fit(texts)
+            # A new model starts with an empty cache
+            by_hash = dict(zip(map(content_hash, texts), vectors))
+            self.store.cache(encoder.model_id).put_many(list(by_hash), list(by_hash.values()))
+        else:
+            vectors = self._encode(encoder, texts)
+        ivf = IVFIndex.build(vectors, self.n_lists(len(texts)))
+        self.store.save_model(encoder, ivf.centroids)
+        self.state = DenseState(encoder, ivf, np.zeros(len(texts), dtype=bool))
+
+    def restore(self, row_hashes, load_texts):
+        """Rebuild the rows from the saved model and the cache.
+
+        `row_hashes` holds the content hash of each lexical row (None for
+        tombstoned rows) and `load_texts(rows)` the texts of rows missing from
+        the cache. Returns False when there is no saved model for the configured
+        encoder, and the caller has to do a full build.
+        """
+        saved = self.store.load_model()
+        if saved is None:
+            return False
+        meta, arrays = saved
+        if meta['encoder'] != self.encoder.name:
+            return False
+        if self.encoder.trainable:
+            encoder = LSAEncoder.restore(arrays, meta['params'])
+            if encoder.dimensions != self.encoder.dimensions:
+                return False
+        elif meta['model_id'] != self.encoder.model_id:
+            return False
+        else:
+            encoder = self.encoder
+
+        live = [row for row, value in enumerate(row_hashes) if value is not None]
+        cached = self.store.cache(encoder.model_id).get_many([row_hashes[row] for row in live])
+        missing = [row for row in live if row_hashes[row] not in cached]
+        if missing:
+            cached.update(zip(
+                (row_hashes[row] for row in missing),
+                self._encode(encoder, load_texts(missing)),
+            ))
+
+        # Tombstoned rows keep a zero vector so row numbers stay aligned
+        vectors = np.zeros((len(row_hashes), encoder.vector_size), dtype=np.float32)
+        for row in live:
+            vectors[row] = cached[row_hashes[row]]
+        centroids = arrays['centroids'] if arrays['centroids'].size else None
+        ivf = IVFIndex.build(vectors, centroids=centroids)
+        self.state = DenseState(encoder, ivf, np.array([value is None for value in row_hashes], dtype=bool))
+        return True
+
+    def clear(self):
+        self.state = None
+
+    def append(self, texts):
+        """Encode new texts as rows after the existing ones"""
+        state = self.state
+        if not texts:
+            return
+        self.state = DenseState(
+            state.encoder,
+            state.ivf.extend(self._encode(state.encoder, texts)),
+            np.concatenate([state.tombstones, np.zeros(len(texts), dtype=bool)]),
+        )
+
+    def delete(self, rows):
+        tombstones = self.state.tombstones.copy()
+        tombstones[list(rows)] = True
+        self.state = self.state._replace(tombstones=tombstones)
+
+    def search_batch(self, queries, top_k, state=None):
+        """One (rows, scores) pair per query: the closest live rows above the threshold, best first"""
+        if state is None:
+            state = self.state
+        if state is None:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        query_matrix = state.encoder.encode(list(queries), self.batch_size)
+        return state.ivf.search_batch(query_matrix, top_k, self.threshold, state.tombstones, self.nprobe)
+
+    def _encode(self, encoder, texts):
+        """Vectors of texts, encoding in batches only those the cache doesn't have"""
+        cache = self.store.cache(encoder.model_id)
+        hashes = [content_hash(text) for text in texts]
+        vectors = cache.get_many(hashes)
+        # Each distinct text is encoded once, even if several chunks share it
+        missing = list({value: text for value, text in zip(hashes, texts) if value not in vectors}.items())
+        if missing:
+            start = time.perf_counter()
+            hits = sum(value in vectors for value in hashes)
+            encoded = encoder.encode([text for _, text in missing], self.batch_size)
+            cache.put_many([value for value, _ in missing], encoded)
+            vectors.update(zip((value for value, _ in missing), encoded))
+            print(f"Encoded {len(missing)} chunks in {time.perf_counter() - start:.2f}s "
+                  f"({hits} of {len(texts)} from the embedding cache)")
+        if not texts:
+            return np.zeros((0, encoder.vector_size), dtype=np.float32)
+        return np.stack([vectors[value] for value in hashes])
@@ -0,0 +1,130 @@
+# backend/dense_store.py
+import os
+import json
+import uuid
+import glob
+import shutil
+import numpy as np
+from app.backend.utils import write_npz
+
+# Identifies files written by this store and the layout version inside them
+STORE_FORMAT = 'botmit-dense'
+STORE_VERSION = 1
+
+
+class EmbeddingCache:
+    """Vectors of one encoder model by chunk content hash.
+
+    Each batch of newly encoded chunks is appended as its own shard file, so a
+    write never rewrites earlier vectors; shards are merged into one once there
+    are more than `max_shards`. Entries are kept after their chunks are
+    deleted, so re-indexing the same text (a re-uploaded PDF, a refit) costs a
+    lookup instead of an encode. Shards written by other worker processes are
+    read the next time the cache is used.
+    """
+
+    def __init__(self, directory, max_shards=32):
+        self.directory = directory
+        self.max_shards = max_shards
+        self._vectors = {}
+        self._loaded = set()
+
+    def _shards(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'shard-*.npz')))
+
+    def _load(self):
+        for path in self._shards():
+            if path in self._loaded:
+                continue
+            try:
+                with np.load(path) as shard:
+                    self._vectors.update(zip(shard['hashes'].tolist(), shard['vectors']))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable embedding cache shard {path}: {e}")
+            self._loaded.add(path)
+        return self._vectors
+
+    def __len__(self):
+        return len(self._load())
+
+    def get_many(self, hashes):
+        """Cached vectors of the given content hashes, by hash"""
+        vectors = self._load()
+        return {value: vectors[value] for value in hashes if value in vectors}
+
+    def put_many(self, hashes, vectors):
+        if not len(hashes):
+            return
+        self._load().update(zip(hashes, vectors))
+        os.makedirs(self.directory, exist_ok=True)
+        shards = self._shards()
+        if len(shards) >= self.max_shards:
+            # Merge everything into one shard, then drop the ones it replaces
+            hashes, vectors = list(self._vectors), np.stack(list(self._vectors.values()))
+        path = os.path.join(self.directory, f"shard-{uuid.uuid4().hex}.npz")
+        write_npz(path, hashes=np.array(hashes, dtype=str), vectors=np.asarray(vectors, dtype=np.float32))
+        self._loaded.add(path)
+        if len(shards) >= self.max_shards:
+            for path in shards:
+                os.remove(path)
+                self._loaded.discard(path)
+
+
+class DenseVectorStore:
+    """On-disk state of the dense index, under one directory.
+
+    `model.npz` holds the fitted encoder (for trainable encoders) and the IVF
+    centroids of the last full build; `cache/<model_id>/` holds the embedding
+    cache of each model. Row vectors aren't stored separately: on start-up
+    they come from the cache by content hash, which makes the cache the only
+    copy of encoded chunks that has to be kept up to date.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.model_path = os.path.join(directory, 'model.npz')
+        self._caches = {}
+
+    def cache(self, model_id):
+        if model_id not in self._caches:
+            self._caches[model_id] = EmbeddingCache(os.path.join(self.directory, 'cache', model_id))
+        return self._caches[model_id]
+
+    def save_model(self, encoder, centroids):
+        """Save the encoder and centroids of a full build, dropping caches of models that can't be used again"""
+        arrays, params = encoder.state()
+        os.makedirs(self.directory, exist_ok=True)
+        write_npz(
+            self.model_path,
+            meta=np.array(json.dumps({
+                'format': STORE_FORMAT,
+                'version': STORE_VERSION,
+                'encoder': encoder.name,
+                'model_id': encoder.model_id,
+                'params': params,
+            })),
+            centroids=np.zeros((0, 0), dtype=np.float32) if centroids is None else centroids,
+            **arrays,
+        )
+
+        cache_dir = os.path.join(self.directory, 'cache')
+        for model_id in os.listdir(cache_dir) if os.path.isdir(cache_dir) else ():
+            if model_id != encoder.model_id:
+                shutil.rmtree(os.path.join(cache_dir, model_id), ignore_errors=True)
+                self._caches.pop(model_id, None)
+
+    def load_model(self):
+        """(meta, arrays) of the last full build, or None when there is nothing usable on disk"""
+        if not os.path.exists(self.model_path):
+            return None
+        try:
+            with np.load(self.model_path) as saved:
+                arrays = {name: saved[name] for name in saved.files}
+            meta = json.loads(str(arrays.pop('meta')))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Dense model file {self.model_path} is unreadable, ignoring it: {e}")
+            return None
+        if meta.get('format') != STORE_FORMAT or meta.get('version', 0) > STORE_VERSION:
+            print(f"Dense model file {self.model_path} has an unsupported format, ignoring it")
+            return None
+        return meta, arrays
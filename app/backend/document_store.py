@@ -0,0 +1,236 @@
+# backend/document_store.py
+import os
+import json
+from app.backend.sparse_store import content_hash
+from app.backend.utils import SQLiteConnections
+
+# Where a PDF chunk came from: first and last page (1-based), start offset within
+# the first page's text and end offset within the last page's. Absent for other documents
+LOCATION_FIELDS = ('page_start', 'page_end', 'char_start', 'char_end')
+
+
+def metadata(document):
+    """The part of a document kept in memory: everything except its content"""
+    return {
+        'id': document['id'],
+        'title': document['title'],
+        'source': document['source'],
+        'content_hash': document.get('content_hash') or content_hash(document['content']),
+    }
+
+
+class DocumentStore:
+    """Interface for document storage backends.
+
+    The engine keeps only metadata (see `metadata`) in memory and asks the
+    store for full documents when it needs their content.
+    """
+
+    def load(self):
+        """Return the metadata of every document, in insertion order"""
+        raise NotImplementedError
+
+    def get_many(self, doc_ids):
+        """Return {id: full document} for the given IDs"""
+        raise NotImplementedError
+
+    def iter_contents(self, doc_ids, batch_size=500):
+        """Yield the content of each given document, in order, fetching in batches"""
+        doc_ids = list(doc_ids)
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start:start + batch_size]
+            documents = self.get_many(batch)
+            for doc_id in batch:
+                yield documents[doc_id]['content']
+
+    def add(self, documents):
+        """Store new documents (with content) in one atomic write.
+
+        The store gives each document the next free ID as part of that write,
+        sets it as `document['id']` and returns the documents.
+        """
+        raise NotImplementedError
+
+    def delete(self, doc_ids):
+        """Remove documents in one atomic write"""
+        raise NotImplementedError
+
+
+class JSONDocumentStore(DocumentStore):
+    """Original single-file layout: every document in one JSON file, rewritten on each change.
+
+    IDs come from this process's counter and each write replaces the whole
+    file, so only one process may edit it; use the SQLite store with several workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._documents = {}
+        self._next_id = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            print(f"Data file not found at {self.path}, starting with empty documents")
+            return []
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        documents = data['documents']
+
+        # Older files may contain duplicate or missing IDs; assign fresh ones once
+        ids = [doc.get('id') for doc in documents]
+        if len(set(ids)) != len(ids) or not all(isinstance(doc_id, int) for doc_id in ids):
+            for i, doc in enumerate(documents):
+                doc['id'] = i
+
+        self._documents = {doc['id']: doc for doc in documents}
+        self._next_id = max(data.get('next_id') or 0, max(self._documents, default=-1) + 1)
+        return [metadata(doc) for doc in documents]
+
+    def get_many(self, doc_ids):
+        return {doc_id: self._documents[doc_id] for doc_id in doc_ids if doc_id in self._documents}
+
+    def add(self, documents):
+        for doc in documents:
+            doc['id'] = self._next_id
+            self._next_id += 1
+            self._documents[doc['id']] = doc
+        self._write()
+        return documents
+
+    def delete(self, doc_ids):
+        for doc_id in doc_ids:
+            self._documents.pop(doc_id, None)
+        self._write()
+
+    def _write(self):
+        """Rewrite the file via a temporary file so an interrupted write can't corrupt it"""
+        tmp_path = self.path + '.tmp'
+        documents = [
+            {key: doc[key] for key in ('id', 'title', 'content', 'source') + LOCATION_FIELDS if key in doc}
+            for doc in self._documents.values()
+        ]
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documents': documents, 'next_id': self._next_id}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """SQLite (WAL mode) backend with per-document writes and on-demand content loading"""
+
+    def __init__(self, path, import_path=None):
+        self.path = path
+        self.import_path = import_path
+        self._connections = SQLiteConnections(path)
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY,"
+                " title TEXT NOT NULL,"
+                " source TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # Added after the first release; older databases get the columns as NULL
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            for field in LOCATION_FIELDS:
+                if field not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {field} INTEGER")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _import_json(self):
+        """One-time import of the legacy JSON file into an empty database, keeping its IDs"""
+        if not self.import_path or not os.path.exists(self.import_path):
+            return
+        conn = self._connection()
+        if conn.execute("SELECT value FROM meta WHERE key = 'imported_from'").fetchone():
+            return
+
+        legacy = JSONDocumentStore(self.import_path)
+        documents = legacy.load()
+        with conn:
+            # Workers starting together: the first to take the write lock imports, the others see its marker
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT value FROM meta WHERE key = 'imported_from'").fetchone():
+                return
+            self._insert(conn, list(legacy.get_many([doc['id'] for doc in documents]).values()))
+            self._set_meta(conn, 'next_id', legacy._next_id)
+            self._set_meta(conn, 'imported_from', os.path.abspath(self.import_path))
+        print(f"Imported {len(documents)} documents from {self.import_path} into {self.path}")
+
+    def load(self):
+        self._import_json()
+        conn = self._connection()
+        rows = conn.execute("SELECT id, title, source, content_hash FROM documents ORDER BY id").fetchall()
+        return [
+            {'id': doc_id, 'title': title, 'source': source, 'content_hash': digest}
+            for doc_id, title, source, digest in rows
+        ]
+
+    def get_many(self, doc_ids):
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ','.join('?' * len(doc_ids))
+        rows = self._connection().execute(
+            f"SELECT id, title, source, content, {', '.join(LOCATION_FIELDS)} FROM documents WHERE id IN ({placeholders})",
+            doc_ids,
+        ).fetchall()
+        documents = {}
+        for doc_id, title, source, content, *location in rows:
+            documents[doc_id] = {'id': doc_id, 'title': title, 'content': content, 'source': source}
+            if location[0] is not None:
+                documents[doc_id].update(zip(LOCATION_FIELDS, location))
+        return documents
+
+    def add(self, documents):
+        conn = self._connection()
+        with conn:
+            # Take the write lock before reading the counter, so processes adding
+            # at the same time can't hand out the same IDs
+            conn.execute("BEGIN IMMEDIATE")
+            stored = conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+            highest = conn.execute("SELECT MAX(id) FROM documents").fetchone()[0]
+            next_id = max(int(stored[0]) if stored else 0, highest + 1 if highest is not None else 0)
+            for doc in documents:
+                doc['id'] = next_id
+                next_id += 1
+            self._insert(conn, documents)
+            self._set_meta(conn, 'next_id', next_id)
+        return documents
+
+    @staticmethod
+    def _insert(conn, documents):
+        # A plain INSERT: an ID collision raises instead of replacing another document
+        conn.executemany(
+            "INSERT INTO documents (id, title, source, content, content_hash, "
+            f"{', '.join(LOCATION_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (doc['id'], doc['title'], doc['source'], doc['content'], doc.get('content_hash') or content_hash(doc['content']),
+                 *(doc.get(field) for field in LOCATION_FIELDS))
+                for doc in documents
+            ],
+        )
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def delete(self, doc_ids):
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in doc_ids])
+
+
+def create_document_store(backend, data_dir):
+    """Build the configured document store backend"""
+    json_path = os.path.join(data_dir, 'university_data.json')
+    if backend == 'json':
+        return JSONDocumentStore(json_path)
+    if backend == 'sqlite':
+        return SQLiteDocumentStore(os.path.join(data_dir, 'university_data.db'), import_path=json_path)
+    raise ValueError(f"Unknown document store backend: {backend}")
@@ -0,0 +1,148 @@
+# backend/encoders.py
+import os
+import uuid
+import hashlib
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from config import DENSE_MODEL, DENSE_DIMENSIONS
+
+
+def normalize_rows(vectors):
+    """L2-normalize rows in place; all-zero rows (no known terms) stay zero"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+    return vectors
+
+
+class Encoder:
+    """Interface for dense text encoders.
+
+    `encode` returns L2-normalized float32 rows, so a dot product is the
+    cosine similarity. `model_id` names the vector space the rows belong to:
+    vectors of different models can't be compared, so cached vectors are kept
+    per model. Trainable encoders are fitted on the corpus at each full build
+    and get a new model_id each time; pretrained ones never change.
+    `order_sensitive` encoders give a different vector when the words of a text
+    are reordered, so their queries can't share cached results with reorderings.
+    """
+
+    name = None
+    trainable = False
+    order_sensitive = False
+    model_id = None
+
+    @property
+    def vector_size(self):
+        raise NotImplementedError
+
+    def fit(self, texts):
+        """Fit a trainable encoder on the corpus and return the vectors of its texts"""
+        return self.encode(texts)
+
+    def encode(self, texts, batch_size=64):
+        raise NotImplementedError
+
+    def state(self):
+        """(arrays, parameters) to persist a fitted encoder"""
+        return {}, {}
+
+
+class LSAEncoder(Encoder):
+    """Latent semantic analysis: TF-IDF vectors projected onto the corpus's top singular vectors.
+
+    Terms that occur in the same chunks load on the same latent dimensions, so
+    a question can match a chunk that words it differently ("fees" and
+    "tuition", "hostel" and "accommodation") as long as the corpus uses both.
+    Runs anywhere scikit-learn does; encoding is one sparse product.
+    """
+
+    name = 'lsa'
+    trainable = True
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.vectorizer = TfidfVectorizer(sublinear_tf=True, stop_words='english')
+        self.components = None
+
+    @property
+    def vector_size(self):
+        return self.components.shape[0]
+
+    def fit(self, texts):
+        tfidf = self.vectorizer.fit_transform(texts).astype(np.float32)
+        # The SVD needs fewer components than documents and terms
+        n_components = max(1, min(self.dimensions, tfidf.shape[0] - 1, tfidf.shape[1] - 1))
+        svd = TruncatedSVD(n_components, random_state=0).fit(tfidf)
+        self.components = svd.components_.astype(np.float32)
+        self.model_id = f"lsa-{uuid.uuid4().hex[:16]}"
+        # The corpus is already vectorized: project it rather than tokenizing it again
+        return self._project(tfidf)
+
+    def _project(self, tfidf):
+        return normalize_rows(np.asarray(tfidf.astype(np.float32) @ self.components.T, dtype=np.float32))
+
+    def encode(self, texts, batch_size=64):
+        rows = [
+            self._project(self.vectorizer.transform(texts[start:start + batch_size]))
+            for start in range(0, len(texts), batch_size)
+        ]
+        if not rows:
+            return np.zeros((0, self.vector_size), dtype=np.float32)
+        return np.vstack(rows)
+
+    def state(self):
+        arrays = {
+            'terms': np.array(self.vectorizer.get_feature_names_out(), dtype=str),
+            'idf': np.asarray(self.vectorizer.idf_, dtype=np.float64),
+            'components': self.components,
+        }
+        return arrays, {'dimensions': self.dimensions, 'model_id': self.model_id}
+
+    @classmethod
+    def restore(cls, arrays, params):
+        encoder = cls(params['dimensions'])
+        encoder.vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(arrays['terms'])}
+        encoder.vectorizer.idf_ = arrays['idf']
+        encoder.components = np.asarray(arrays['components'], dtype=np.float32)
+        encoder.model_id = params['model_id']
+        return encoder
+
+
+class SentenceTransformerEncoder(Encoder):
+    """A pretrained sentence-transformers model loaded from a local directory and run on the CPU.
+
+    Nothing is downloaded: DENSE_MODEL must point at a model saved with
+    `SentenceTransformer.save()`. The model_id is derived from that path, so
+    point it at a new directory when changing models.
+    """
+
+    name = 'sentence-transformers'
+    order_sensitive = True
+
+    def __init__(self, model_path):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("DENSE_ENCODER=sentence-transformers needs the sentence-transformers package") from e
+        if not model_path or not os.path.isdir(model_path):
+            raise ValueError(f"DENSE_MODEL must be a local model directory, got {model_path!r}")
+        self.model = SentenceTransformer(model_path, device='cpu')
+        self.model_id = "st-" + hashlib.sha256(os.path.abspath(model_path).encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def vector_size(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        vectors = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def create_encoder(name):
+    """An encoder of the configured kind, unfitted if it is trainable"""
+    if name == 'lsa':
+        return LSAEncoder(DENSE_DIMENSIONS)
+    if name == 'sentence-transformers':
+        return SentenceTransformerEncoder(DENSE_MODEL)
+    raise ValueError(f"Unknown dense encoder: {name}")
@@ -0,0 +1,179 @@
+# backend/incremental_index.py
+from collections import namedtuple
+import numpy as np
+from scipy import sparse
+from app.backend.sparse_store import SparseEmbeddingStore
+from app.backend.retrieval import InvertedIndex
+from app.backend.retrievers import create_retriever
+
+# What a search reads, published as one object so a reader never pairs a new
+# retriever or matrix with old tombstones or postings. `base` holds the rows of
+# the last full build (memory-mapped from the store), `appended` the rows added since
+IndexState = namedtuple('IndexState', ['retriever', 'base', 'appended', 'tombstones', 'postings'])
+
+
+class IncrementalIndex:
+    """Lexical index that appends new rows and tombstones deleted ones between full refits.
+
+    Rows are weighted by the configured retriever (TF-IDF or BM25). New texts
+    are weighted with the vocabulary and statistics fitted at the last full build,
+    so terms that were unseen at that point are not searchable until the next
+    refit. `needs_compaction` reports when that vocabulary drift, or the share of
+    tombstoned rows, has grown past the configured thresholds.
+
+    Every change builds a new IndexState and swaps it in with a single
+    assignment, so searches keep using the previous state until then. Changes
+    are also collected until `persist` saves them as one delta segment.
+    """
+
+    def __init__(self, store, retriever='tfidf', drift_threshold=0.1, tombstone_threshold=0.2):
+        self.store = store
+        self.retriever_name = retriever
+        self.drift_threshold = drift_threshold
+        self.tombstone_threshold = tombstone_threshold
+        self.clear()
+
+    @property
+    def retriever(self):
+        return self.state.retriever
+
+    @property
+    def embeddings(self):
+        """All rows as one matrix (a copy once rows have been appended)"""
+        state = self.state
+        if state.appended.shape[0] == 0:
+            return state.base
+        return sparse.vstack([state.base, state.appended], format='csr')
+
+    @property
+    def n_rows(self):
+        return self.state.base.shape[0] + self.state.appended.shape[0]
+
+    @property
+    def tombstones(self):
+        return self.state.tombstones
+
+    @property
+    def is_fitted(self):
+        return hasattr(self.retriever, 'vocabulary_')
+
+    def fit(self, texts, content_fingerprint, doc_ids):
+        """Refit the retriever over all texts, the documents `doc_ids`, and write a fresh base file"""
+        retriever = create_retriever(self.retriever_name)
+        stored = self.store.save(retriever.fit_transform(texts), retriever, content_fingerprint, doc_ids)
+
+        # Serve from the saved, memory-mapped arrays rather than this process's private copy
+        base = stored.embeddings
+        self.state = IndexState(
+            retriever,
+            base,
+            SparseEmbeddingStore.empty(base.shape[1]),
+            np.zeros(base.shape[0], dtype=bool),
+            stored.postings,
+        )
+        self.oov_terms = set()
+        self._clear_pending()
+
+    def clear(self):
+        """Forget all rows, e.g. when the last document was deleted"""
+        empty = SparseEmbeddingStore.empty()
+        self.state = IndexState(create_retriever(self.retriever_name), empty, empty, np.zeros(0, dtype=bool), InvertedIndex.build(empty))
+        self.oov_terms = set()
+        self._clear_pending()
+
+    def _clear_pending(self):
+        """Forget the changes not persisted yet: appended rows and their document IDs, tombstoned rows, unseen terms"""
+        self._pending_rows = []
+        self._pending_ids = []
+        self._pending_tombstones = []
+        self._pending_oov = set()
+
+    def restore(self, stored):
+        """Adopt an index loaded from disk"""
+        appended = stored.appended
+        if appended is None:
+            appended = SparseEmbeddingStore.empty(stored.embeddings.shape[1])
+        tombstones = stored.tombstones
+        if tombstones is None:
+            tombstones = np.zeros(stored.embeddings.shape[0] + appended.shape[0], dtype=bool)
+        self.state = IndexState(stored.retriever, stored.embeddings, appended, tombstones, stored.postings)
+        self.oov_terms = set(stored.oov_terms)
+        self._clear_pending()
+
+    def append(self, texts, doc_ids):
+        """Weight new texts, the documents `doc_ids`, with the current vocabulary and statistics and return their row numbers"""
+        state = self.state
+        start = self.n_rows
+        if not texts:
+            return []
+
+        # Collect the terms the current vocabulary can't represent, each counted once
+        analyzer = state.retriever.build_analyzer()
+        vocabulary = state.retriever.vocabulary_
+        unseen = set()
+        for text in texts:
+            unseen.update(term for term in analyzer(text) if term not in vocabulary)
+        unseen -= self.oov_terms
+        self.oov_terms |= unseen
+        self._pending_oov |= unseen
+
+        # Only the small appended segment is copied; the base stays shared
+        rows = SparseEmbeddingStore.prepare(state.retriever.transform(texts))
+        self._pending_rows.append(rows)
+        self._pending_ids.extend(doc_ids)
+        self.state = IndexState(
+            state.retriever,
+            state.base,
+            sparse.vstack([state.appended, rows], format='csr'),
+            np.concatenate([state.tombstones, np.zeros(len(texts), dtype=bool)]),
+            state.postings.extend(rows),
+        )
+        return list(range(start, start + len(texts)))
+
+    def delete(self, rows):
+        """Tombstone rows so they are skipped by search"""
+        tombstones = self.state.tombstones.copy()
+        tombstones[list(rows)] = True
+        self.state = self.state._replace(tombstones=tombstones)
+        self._pending_tombstones.extend(rows)
+
+    def persist(self, content_fingerprint):
+        """Save the changes made since the last persist as one delta segment"""
+        if self._pending_rows:
+            rows = sparse.vstack(self._pending_rows, format='csr')
+        else:
+            rows = SparseEmbeddingStore.empty(self.state.base.shape[1])
+        self.store.save_delta(rows, self._pending_ids, self._pending_tombstones, self._pending_oov, content_fingerprint)
+        self._clear_pending()
+
+    @property
+    def drift(self):
+        """Distinct new terms seen since the last refit, relative to the fitted vocabulary size"""
+        if not self.is_fitted or not self.oov_terms:
+            return 0.0
+        return len(self.oov_terms) / max(len(self.retriever.vocabulary_), 1)
+
+    @property
+    def tombstone_ratio(self):
+        if len(self.tombstones) == 0:
+            return 0.0
+        return float(self.tombstones.mean())
+
+    def needs_compaction(self):
+        return self.drift > self.drift_threshold or self.tombstone_ratio > self.tombstone_threshold
+
+    def search_batch(self, queries, top_k, threshold=None, state=None):
+        """Return one (rows, scores) pair per query: the best live rows above threshold, best first.
+
+        Searches the current state unless given an earlier one. The threshold
+        defaults to the retriever's.
+        """
+        if state is None:
+            state = self.state
+        if not hasattr(state.retriever, 'vocabulary_'):
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        if threshold is None:
+            threshold = state.retriever.threshold
+        # One transform and one sparse product for the whole batch
+        query_matrix = state.retriever.transform_queries(queries)
+        return state.postings.search_batch(query_matrix, top_k, threshold, state.tombstones)
@@ -0,0 +1,81 @@
+# backend/ingestion.py
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+# Below this many pages a process pool costs more than it saves
+MIN_PAGES_FOR_POOL = 8
+
+# Pool processes start from a fresh interpreter: the pool is created from a request or
+# job thread, and a forked child would inherit locks held by the server's other threads
+POOL_CONTEXT = multiprocessing.get_context('spawn')
+
+
+def file_hash(path):
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_pages(pdf_path, start, stop):
+    """Extract the text of pages [start, stop); runs in a worker process"""
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+class PDFTextExtractor:
+    """Extracts PDF text page-parallel and caches the pages by file content hash"""
+
+    def __init__(self, cache_dir, max_workers=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.pages.json")
+
+    def extract_pages(self, pdf_path, digest=None):
+        """Return the text of each page of a PDF, cached by file hash"""
+        digest = digest or file_hash(pdf_path)
+        cache_path = self._cache_path(digest)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        pages = self._extract_all_pages(pdf_path)
+
+        # Write via a temporary file so a crash can't leave a truncated cache entry
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, cache_path)
+        return pages
+
+    def _extract_all_pages(self, pdf_path):
+        with open(pdf_path, 'rb') as file:
+            page_count = len(PyPDF2.PdfReader(file).pages)
+
+        workers = min(self.max_workers, page_count)
+        if workers <= 1 or page_count < MIN_PAGES_FOR_POOL:
+            return _extract_pages(pdf_path, 0, page_count)
+
+        # Contiguous page ranges, one batch per worker, reassembled in order
+        step = -(-page_count // workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+                futures = [pool.submit(_extract_pages, pdf_path, start, stop) for start, stop in ranges]
+                pages = []
+                for future in futures:
+                    pages.extend(future.result())
+                return pages
+        except (OSError, RuntimeError) as e:
+            print(f"Process pool unavailable ({e}), extracting {os.path.basename(pdf_path)} in-process")
+            return _extract_pages(pdf_path, 0, page_count)
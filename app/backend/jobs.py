@@ -0,0 +1,112 @@
+# backend/jobs.py
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """A unit of background work and its progress"""
+
+    def __init__(self, description):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'description': self.description,
+            'status': self.status,
+            'stage': self.stage,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """Runs jobs one at a time on a background thread.
+
+    Job status is also written to `status_dir` so any worker process can answer
+    a status request, not just the one that accepted the job.
+    """
+
+    def __init__(self, status_dir, max_history=100):
+        self.status_dir = status_dir
+        self.max_history = max_history
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job')
+        os.makedirs(self.status_dir, exist_ok=True)
+
+    def submit(self, description, fn, *args, **kwargs):
+        """Queue fn(*args, progress=callback, **kwargs) and return its Job right away"""
+        job = Job(description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._save(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return the status dict of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        # Possibly accepted by another worker process
+        path = self._status_path(job_id)
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def _run(self, job, fn, args, kwargs):
+        def progress(stage):
+            job.stage = stage
+            self._save(job)
+
+        job.status = 'running'
+        self._save(job)
+        try:
+            job.result = fn(*args, progress=progress, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            print(f"Job {job.id} ({job.description}) failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = time.time()
+        self._save(job)
+
+    def _status_path(self, job_id):
+        # IDs are hex UUIDs; anything else can't name a status file
+        if not all(c in '0123456789abcdef' for c in job_id) or len(job_id) != 32:
+            return None
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        path = self._status_path(job.id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond max_history"""
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job.id]
+            path = self._status_path(job.id)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,269 @@
+# backend/llm.py
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import (
+    GOOGLE_API_KEY, LLM_BACKEND, LLM_MODEL, LLM_MAX_CONCURRENCY, LLM_TIMEOUT, LLM_ATTEMPT_TIMEOUT,
+    LLM_RETRIES, LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET, LLM_STUB_LATENCY,
+)
+from app.backend.metrics import LLM_ERRORS
+
+
+class LLMError(Exception):
+    """The LLM could not produce an answer"""
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class LLMBackend:
+    """Interface for text generation backends"""
+
+    def generate(self, prompt):
+        """Return the full answer to a prompt"""
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        """Yield the answer to a prompt in pieces"""
+        yield self.generate(prompt)
+
+    def is_retryable(self, error):
+        """Whether a failed call is worth repeating (and counts against the circuit breaker)"""
+        return True
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google-generativeai; one configured model shared by all calls"""
+
+    def __init__(self, api_key, model_name):
+        # Imported here so the stub backend runs without the Google client libraries
+        import google.generativeai as genai
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    def is_retryable(self, error):
+        from google.api_core import exceptions
+        return isinstance(error, (
+            exceptions.ServiceUnavailable, exceptions.TooManyRequests, exceptions.ResourceExhausted,
+            exceptions.InternalServerError, exceptions.DeadlineExceeded, ConnectionError, TimeoutError,
+        ))
+
+
+class StubBackend(LLMBackend):
+    """Offline stand-in that answers from the prompt itself after a configurable delay.
+
+    Lists the question and the titles of the documents in the prompt, so the
+    whole chat path (retrieval, prompt, rendering) can be exercised and load
+    tested without network access.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _answer(self, prompt):
+        question = re.search(r"Current User Question: (.*)", prompt)
+        titles = re.findall(r"^Document \d+: (.*)$", prompt, flags=re.MULTILINE)
+        answer = f"**Stub answer** to: {question.group(1) if question else 'your question'}\n"
+        if titles:
+            answer += "\nSources:\n\n" + "".join(f"* {title}\n" for title in titles)
+        return answer
+
+    def generate(self, prompt):
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    def stream(self, prompt):
+        words = self._answer(prompt).split(" ")
+        # Half the delay before the first piece, the rest spread over the others
+        time.sleep(self.latency / 2)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.latency / 2 / len(words))
+            yield word if i == 0 else " " + word
+
+
+class CircuitBreaker:
+    """Fails fast after `threshold` consecutive failures, for `reset_after` seconds.
+
+    After that one trial call is let through (half-open): success closes the
+    circuit again, failure reopens it.
+    """
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        """End a call that says nothing about the backend's health, such as a rejected request.
+
+        Frees the half-open trial slot for the next call; the failure count and
+        open state stay as they are.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class LLMClient:
+    """Process-wide entry point for LLM calls.
+
+    Calls run on a bounded thread pool, which caps concurrent requests to the
+    backend and lets a caller stop waiting at its deadline. Retryable failures
+    are retried with jittered exponential backoff while the deadline allows,
+    and a circuit breaker fails fast while the backend keeps failing.
+    """
+
+    def __init__(self, backend, max_concurrency=8, timeout=60.0, attempt_timeout=25.0, retries=2,
+                 breaker=None, backoff=0.5):
+        self.backend = backend
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+
+    def generate(self, prompt):
+        """Return the full answer, raising LLMError once retries or the deadline run out"""
+        deadline = time.monotonic() + self.timeout
+        return self._with_retries(lambda attempt_deadline: self._call(
+            self.backend.generate, prompt, deadline=attempt_deadline
+        ), deadline)
+
+    def stream(self, prompt):
+        """Yield the answer in pieces. Failures before the first piece are retried; later ones raise"""
+        deadline = time.monotonic() + self.timeout
+        attempt = {}
+
+        def first_piece(attempt_deadline):
+            # A failed attempt leaves its generator closed, so each one starts a new stream
+            attempt['chunks'] = self.backend.stream(prompt)
+            return self._call(next, attempt['chunks'], None, deadline=attempt_deadline)
+
+        piece = self._with_retries(first_piece, deadline)
+        while piece is not None:
+            yield piece
+            piece = self._call(next, attempt['chunks'], None, deadline=deadline, count=False)
+
+    def _with_retries(self, attempt, deadline):
+        for retry in range(self.retries + 1):
+            try:
+                return attempt(min(deadline, time.monotonic() + self.attempt_timeout))
+            except LLMError as e:
+                if isinstance(e, CircuitOpenError) or not getattr(e, 'retryable', True):
+                    raise
+                # Full jitter: a random wait up to the exponential backoff, within the deadline
+                delay = random.uniform(0, self.backoff * 2 ** retry)
+                if retry == self.retries or time.monotonic() + delay >= deadline:
+                    raise
+                print(f"LLM call failed ({e.__cause__ or e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _call(self, fn, *args, deadline, count=True):
+        """Run fn on the pool and wait for it until the deadline"""
+        if count and not self.breaker.allow():
+            LLM_ERRORS.inc(error='circuit_open')
+            raise CircuitOpenError("LLM backend is failing; not calling it for now")
+
+        future = self._pool.submit(fn, *args)
+        try:
+            result = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            # A call that has not started yet is dropped; one in flight finishes on its own
+            future.cancel()
+            if count:
+                self.breaker.record_failure()
+            LLM_ERRORS.inc(error='timeout')
+            raise LLMTimeout("LLM call timed out")
+        except Exception as e:
+            LLM_ERRORS.inc(error=type(e).__name__)
+            retryable = self.backend.is_retryable(e)
+            if count and retryable:
+                self.breaker.record_failure()
+            elif count:
+                self.breaker.release()
+            error = LLMError(str(e))
+            error.retryable = retryable
+            raise error from e
+        if count:
+            self.breaker.record_success()
+        return result
+
+
+def create_backend(name):
+    """Build the configured LLM backend"""
+    if name == 'gemini':
+        return GeminiBackend(GOOGLE_API_KEY, LLM_MODEL)
+    if name == 'stub':
+        return StubBackend(latency=LLM_STUB_LATENCY)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """The process-wide LLM client, created from config on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(
+                create_backend(LLM_BACKEND),
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                timeout=LLM_TIMEOUT,
+                attempt_timeout=LLM_ATTEMPT_TIMEOUT,
+                retries=LLM_RETRIES,
+                breaker=CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET),
+            )
+        return _client
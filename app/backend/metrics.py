@@ -0,0 +1,253 @@
+# backend/metrics.py
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from config import TRACE_LOG
+
+# Upper bounds (seconds) of the latency histogram buckets: sub-millisecond
+# rendering and cached searches up to LLM calls near their deadline
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per combination of label values"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, list(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per combination of label values"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + [('le', _format_value(bound))], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Callback:
+    """Values read when metrics are scraped, e.g. counters another component keeps itself.
+
+    `fn` returns a dict of label value tuples to values.
+    """
+
+    def __init__(self, name, help, type, labels, fn):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def samples(self):
+        return [(self.name, list(zip(self.labels, key)), value) for key, value in sorted(self.fn().items())]
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered in the Prometheus text exposition format.
+
+    Values are per process: under gunicorn each worker reports its own, with
+    its pid as a label so scrapes of different workers can be told apart.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, type, labels, fn):
+        return self.register(Callback(name, help, type, labels, fn))
+
+    def render(self):
+        pid = [('pid', os.getpid())]
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels + pid)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    'botmit_request_seconds', "Time to handle a request, by endpoint", ['endpoint']
+)
+STAGE_SECONDS = registry.histogram(
+    'botmit_stage_seconds', "Time spent in each stage of a chat turn (search, context, llm, render, session_save)",
+    ['stage']
+)
+RETRIEVALS = registry.counter(
+    'botmit_retrievals_total',
+    "Retrievals for chat questions by outcome: direct (the question found documents), "
+    "fallback (only the question combined with the previous one did) or empty",
+    ['outcome']
+)
+ANSWERS = registry.counter(
+    'botmit_answers_total', "Chat answers by source: llm, cache or error", ['source']
+)
+LLM_ERRORS = registry.counter(
+    'botmit_llm_errors_total', "Failed LLM calls by error type", ['error']
+)
+
+
+# The trace of the request being handled on this thread, if any
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+class TraceLog:
+    """Appends one JSON line per traced request to a file; shared by threads, reopened after a fork"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self._lock:
+            if self._pid != os.getpid():
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                # Line buffered: one write per request, and lines from several workers don't interleave
+                self._file = open(self.path, 'a', buffering=1, encoding='utf-8')
+                self._pid = os.getpid()
+            self._file.write(line)
+
+
+trace_log = TraceLog(TRACE_LOG) if TRACE_LOG else None
+
+
+def start_trace(**fields):
+    """Start collecting stage timings and notes for the current request"""
+    trace = {'start': time.perf_counter(), 'stages': {}, 'notes': dict(fields)}
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+def note(**fields):
+    """Record facts about the current request (cache hits, retrieval outcome) in its trace"""
+    trace = _trace.get()
+    if trace is not None:
+        trace['notes'].update(fields)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace['stages'][stage] = trace['stages'].get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    """Time a block as a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def finish_trace(endpoint, **fields):
+    """Record the request's total time and write its trace line, if the trace log is on"""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    _trace.set(None)
+    seconds = time.perf_counter() - trace['start']
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+    if trace_log is not None:
+        record = {'time': time.time(), 'endpoint': endpoint, 'seconds': round(seconds, 6)}
+        record.update(trace['notes'])
+        record.update(fields)
+        record['stages'] = {stage: round(value, 6) for stage, value in trace['stages'].items()}
+        try:
+            trace_log.write(record)
+        except OSError as e:
+            print(f"Error writing trace log: {e}")
+    return trace
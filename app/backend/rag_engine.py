@@ -1,14 +1,39 @@
 # backend/rag_engine.py
 import os
-import json
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import google.generativeai as genai
-import PyPDF2
+import threading
+import time
+import uuid
 import glob
 import hashlib
-from config import GOOGLE_API_KEY
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+from config import (
+    DOCUMENT_STORE, RETRIEVER, INCREMENTAL_INDEXING, INDEX_DRIFT_THRESHOLD, INDEX_TOMBSTONE_THRESHOLD,
+    PDF_EXTRACT_WORKERS, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL,
+    CONTEXT_TOKEN_BUDGET, CONTEXT_SENTENCE_WINDOW, HISTORY_TOKEN_BUDGET, CHUNKER, CHUNK_MAX_WORDS, CHUNK_MIN_WORDS,
+    DENSE_ENCODER, DENSE_BATCH_SIZE, DENSE_THRESHOLD, DENSE_IVF_MIN_ROWS, DENSE_NPROBE,
+)
+from app.backend.sparse_store import SparseEmbeddingStore, content_hash, document_digest, fingerprint
+from app.backend.incremental_index import IncrementalIndex
+from app.backend.dense_index import DenseIndex
+from app.backend.retrieval import reciprocal_rank_fusion
+from app.backend.document_store import LOCATION_FIELDS, create_document_store, metadata
+from app.backend.ingestion import PDFTextExtractor, file_hash
+from app.backend.chunking import chunk_pages
+from app.backend.cache import LRUCache, normalize_query, normalize_question, normalize_whitespace
+from app.backend.context import ContextBuilder, estimate_tokens, trim_to_tokens
+from app.backend.llm import get_llm_client
+from app.backend.metrics import ANSWERS, RETRIEVALS, note, timed
+
+# Everything a search reads, published as one object by a single assignment:
+# read-only document metadata by ID, the document owning each embedding row
+# (None once deleted), the index state those rows belong to, the generation
+# that cached results are keyed by and the dense index state over the same rows
+# (None when dense retrieval is off). Writers never modify a published snapshot.
+IndexSnapshot = namedtuple(
+    'IndexSnapshot', ['documents', 'row_docs', 'index_state', 'generation', 'dense_state'], defaults=(None,)
+)
 
 class RAGEngine:
     def __init__(self, data_dir='data/', embedding_path='embeddings_db/embeddings.npz'):
@@ -17,106 +42,243 @@ class RAGEngine:
         """
         self.data_dir = data_dir
         self.pdf_dir = os.path.join(data_dir, 'pdfs')
-        self.data_path = os.path.join(data_dir, 'university_data.json')
         self.embedding_path = embedding_path
-        self.documents = []
-        self.embeddings = None
-        self.vectorizer = TfidfVectorizer()
+        self.embedding_store = SparseEmbeddingStore(embedding_path)
+        self.index = IncrementalIndex(self.embedding_store, RETRIEVER, INDEX_DRIFT_THRESHOLD, INDEX_TOMBSTONE_THRESHOLD)
+        # Optional dense index, kept row for row in step with the lexical one
+        self.dense = None
+        if DENSE_ENCODER:
+            self.dense = DenseIndex(
+                os.path.join(os.path.dirname(embedding_path), 'dense'), DENSE_ENCODER, DENSE_BATCH_SIZE,
+                DENSE_THRESHOLD, DENSE_IVF_MIN_ROWS, DENSE_NPROBE,
+            )
+        self.incremental = INCREMENTAL_INDEXING
+        # Writer state, only touched under _write_lock. Document metadata keyed by
+        # stable ID; IDs are never reused or renumbered. Content stays in the
+        # document store and is loaded only for search hits. source_docs holds the
+        # IDs under each source ("pdf:<name>" for all chunks of a PDF)
+        self.document_store = None
+        self._documents = {}
+        self.source_docs = {}
+        # Sum of the documents' digests, kept up to date so fingerprinting an edit is O(1)
+        self._digest_sum = 0
+        # Embedding row of each document ID and the document owning each row
+        self.doc_rows = {}
+        self._row_docs = []
+        # Serializes admin edits with the background compaction; edits also hold the
+        # store's lock, which does the same across worker processes
+        self._write_lock = threading.RLock()
+        # The index files on disk as of the last snapshot this process published
+        self._index_signature = None
+        self._compaction_thread = None
+        # What searches read; writers publish a new one after each change
+        self.snapshot = IndexSnapshot(MappingProxyType({}), (), self.index.state, 0)
+        self.retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
+        # LLM answers to standalone questions, with the LLM time each hit saved
+        self.answer_cache = LRUCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+        self.answer_seconds_saved = 0.0
+        # Cache hits are counted from many request threads at once
+        self._seconds_saved_lock = threading.Lock()
+        # Packs retrieved passages into the prompt within a token budget
+        self.context_builder = ContextBuilder(CONTEXT_TOKEN_BUDGET, CONTEXT_SENTENCE_WINDOW)
         
         # Ensure directories exist
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.pdf_dir, exist_ok=True)
         os.makedirs(os.path.dirname(self.embedding_path), exist_ok=True)
-        
-        # Load data and create embeddings if they don't exist
-        self._load_data()
-        self._load_or_create_embeddings()
-        
-        # Configure API
-        self.api_key = GOOGLE_API_KEY
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
+        self.document_store = create_document_store(DOCUMENT_STORE, self.data_dir)
+        # Extracted PDF text is cached by file hash next to the embeddings
+        self.pdf_extractor = PDFTextExtractor(
+            os.path.join(os.path.dirname(self.embedding_path), 'pdf_text'),
+            max_workers=PDF_EXTRACT_WORKERS,
+        )
+        
+        # Load data and create embeddings if they don't exist; workers starting
+        # together take turns, so only the first one builds a missing index
+        with self.embedding_store.lock():
+            self._load_data()
+            self._load_or_create_embeddings()
+        
+        # Shared LLM client (configured once per process)
+        self.llm = get_llm_client()
+    
+    @property
+    def documents(self):
+        """Document metadata by ID, as of the last published snapshot"""
+        return self.snapshot.documents
+    
+    @property
+    def generation(self):
+        """Bumped whenever search results may change; cached results are keyed by it"""
+        return self.snapshot.generation
+    
+    @property
+    def embeddings(self):
+        return self.index.embeddings
+    
+    @property
+    def retriever(self):
+        return self.index.retriever
     
     def _load_data(self):
-        """Load university documents from JSON file and PDF directory"""
+        """Load university document metadata from the document store and process the PDF directory"""
         try:
-            # Load JSON data if it exists
-            if os.path.exists(self.data_path):
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.documents = data['documents']
-                    print(f"Loaded {len(self.documents)} documents from JSON")
-            else:
-                print(f"Data file not found at {self.data_path}, starting with empty documents")
-                self.documents = []
+            self._set_documents(self.document_store.load())
+            print(f"Loaded {len(self._documents)} documents from the document store")
             
             # Check for PDFs that aren't in documents yet
             self._process_pdfs()
             
         except Exception as e:
             print(f"Error loading data: {e}")
-            self.documents = []
+            self._set_documents([])
+    
+    @contextmanager
+    def _editing(self):
+        """Hold the write locks of this process and of the index on disk, with other workers' changes loaded"""
+        with self._write_lock, self.embedding_store.lock():
+            self._sync()
+            yield
+    
+    def refresh(self):
+        """Load changes other worker processes made to the index, if any.
+        
+        Called on the read path, so it costs two stat calls when nothing
+        changed and never waits: while an edit is running, here or in another
+        worker, the current snapshot is served and the next search tries again.
+        """
+        if self.embedding_store.signature() == self._index_signature:
+            return
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            with self.embedding_store.lock(blocking=False) as locked:
+                if locked:
+                    self._sync()
+        finally:
+            self._write_lock.release()
+    
+    def _sync(self):
+        """Reload documents and index if another process published a new index since this one did"""
+        if self.embedding_store.signature() == self._index_signature:
+            return
+        print("Index changed in another worker. Reloading...")
+        self._set_documents(self.document_store.load())
+        self._load_or_create_embeddings()
+    
+    def _set_documents(self, documents):
+        """Key document metadata by ID"""
+        self._documents = {doc['id']: doc for doc in documents}
+        self.source_docs = {}
+        for doc in documents:
+            self.source_docs.setdefault(self._source_key(doc['source']), set()).add(doc['id'])
+        self._digest_sum = sum(document_digest(doc['id'], doc['content_hash']) for doc in documents)
+    
+    @staticmethod
+    def _source_key(source):
+        """Group PDF chunks ("pdf:<name>:chunk<n>") under their PDF ("pdf:<name>")"""
+        if source.startswith('pdf:'):
+            return source.rsplit(':chunk', 1)[0]
+        return source
+    
+    def _new_document(self, title, content, source, location=None):
+        """Create a document, not stored yet, so without an ID.
+        
+        `location` holds the page and character offsets of a PDF chunk.
+        """
+        document = {
+            'title': title,
+            'content': content,
+            'source': source,
+            'content_hash': content_hash(content)
+        }
+        document.update(location or {})
+        return document
+    
+    def _store_documents(self, documents):
+        """Write new documents to the document store and add their metadata to the collection.
+        
+        The store assigns the stable IDs in the same write, so several processes
+        adding documents at once never hand out the same ID.
+        """
+        self.document_store.add(documents)
+        for document in documents:
+            self._documents[document['id']] = metadata(document)
+            self.source_docs.setdefault(self._source_key(document['source']), set()).add(document['id'])
+            self._digest_sum += document_digest(document['id'], document['content_hash'])
+        return documents
     
     def _process_pdfs(self):
-        """Process all PDFs in the pdf directory and add them to documents if not already there"""
+        """Process all PDFs in the pdf directory and add them to documents if not already there.
+        
+        Returns the newly added documents so the caller can index them.
+        """
         # Get list of all PDFs in directory
         pdf_files = glob.glob(os.path.join(self.pdf_dir, "*.pdf"))
         
-        # Track which PDFs are processed
-        processed_files = {doc['source']: doc for doc in self.documents if doc['source'].startswith('pdf:')}
-        
         # Process new PDFs
+        added = []
         for pdf_path in pdf_files:
             pdf_name = os.path.basename(pdf_path)
             pdf_id = f"pdf:{pdf_name}"
             
             # Skip if already processed
-            if pdf_id in processed_files:
+            if pdf_id in self.source_docs:
                 continue
                 
             try:
-                # Extract text from PDF
-                pdf_text = self._extract_text_from_pdf(pdf_path)
-                
-                # Create a document for each page or chunk to keep context reasonable
-                chunks = self._chunk_text(pdf_text, chunk_size=1000, overlap=200)
-                
-                for i, chunk in enumerate(chunks):
-                    doc_id = len(self.documents)
-                    document = {
-                        'id': doc_id,
-                        'title': f"{pdf_name} - Chunk {i+1}",
-                        'content': chunk,
-                        'source': f"{pdf_id}:chunk{i+1}"
-                    }
-                    self.documents.append(document)
-                
+                chunks = self._read_pdf_chunks(pdf_path)
+                added.extend(self._add_pdf_chunks(pdf_name, chunks))
                 print(f"Processed PDF: {pdf_name} into {len(chunks)} chunks")
             
             except Exception as e:
                 print(f"Error processing PDF {pdf_name}: {e}")
         
-        # Save updated documents
-        if pdf_files:
-            self._save_documents()
+        # Save the new chunks in one write
+        if added:
+            self._store_documents(added)
+        
+        return added
+    
+    def _read_pdf_chunks(self, pdf_path, timings=None, progress=None):
+        """Extract a PDF's text and split it into chunks, recording seconds per stage in `timings`"""
+        if timings is None:
+            timings = {}
+        
+        # Extract the text of each page (cached by file hash)
+        if progress:
+            progress('extracting')
+        start = time.perf_counter()
+        pages = self._extract_pages_from_pdf(pdf_path)
+        timings['extract'] = timings.get('extract', 0.0) + time.perf_counter() - start
+        
+        # Create a document for each chunk to keep context reasonable
+        if progress:
+            progress('chunking')
+        start = time.perf_counter()
+        chunks = chunk_pages(pages, CHUNKER, CHUNK_MAX_WORDS, CHUNK_MIN_WORDS)
+        timings['chunk'] = timings.get('chunk', 0.0) + time.perf_counter() - start
+        return chunks
+    
+    def _add_pdf_chunks(self, pdf_name, chunks):
+        """Create a document for each chunk of a PDF, titled with its pages"""
+        documents = []
+        for i, chunk in enumerate(chunks):
+            pages = chunk['page_start'] if chunk['page_start'] == chunk['page_end'] else f"{chunk['page_start']}-{chunk['page_end']}"
+            location = {field: chunk[field] for field in LOCATION_FIELDS}
+            documents.append(self._new_document(
+                f"{pdf_name} - Chunk {i+1} (p. {pages})", chunk['text'], f"pdf:{pdf_name}:chunk{i+1}", location
+            ))
+        return documents
     
     def delete_document(self, doc_id):
         """Delete a document from the collection by ID"""
-        if doc_id < 0 or doc_id >= len(self.documents):
-            raise ValueError(f"Document ID {doc_id} not found")
-        
-        # Remove the document
-        self.documents.pop(doc_id)
-        
-        # Recalculate IDs to maintain consistency
-        for i, doc in enumerate(self.documents):
-            doc['id'] = i
-        
-        # Update embeddings
-        self._create_embeddings()
-        
-        # Save updated documents
-        self._save_documents()
+        with self._editing():
+            if doc_id not in self._documents:
+                raise ValueError(f"Document ID {doc_id} not found")
+            
+            # Remove the document; other IDs and embedding rows stay where they are
+            self._remove_documents([doc_id])
         
         return True
 
@@ -124,34 +286,47 @@ class RAGEngine:
         """Delete a PDF file and its associated documents"""
         pdf_path = os.path.join(self.pdf_dir, filename)
         
-        # Check if file exists
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF file {filename} not found")
-        
-        # Remove the file
-        os.remove(pdf_path)
-        
-        # Remove all documents associated with this PDF
-        pdf_id = f"pdf:{filename}"
-        self.documents = [doc for doc in self.documents if not doc['source'].startswith(pdf_id)]
+        with self._editing():
+            # Check if file exists
+            if not os.path.exists(pdf_path):
+                raise FileNotFoundError(f"PDF file {filename} not found")
+            
+            # Remove the file
+            os.remove(pdf_path)
+            
+            # Remove all documents associated with this PDF
+            self._remove_source(f"pdf:{filename}")
         
-        # Recalculate IDs to maintain consistency
-        for i, doc in enumerate(self.documents):
-            doc['id'] = i
+        return True
+    
+    def _remove_source(self, source_key):
+        """Remove every document under a source"""
+        self._remove_documents(list(self.source_docs.get(source_key, ())))
+    
+    def _remove_documents(self, doc_ids):
+        """Remove documents from the collection, the index and storage"""
+        removed_rows = []
+        for doc_id in doc_ids:
+            document = self._documents.pop(doc_id)
+            removed_rows.append(self.doc_rows.pop(doc_id))
+            self._digest_sum -= document_digest(doc_id, document['content_hash'])
+            source_key = self._source_key(document['source'])
+            self.source_docs[source_key].discard(doc_id)
+            if not self.source_docs[source_key]:
+                del self.source_docs[source_key]
         
         # Update embeddings
-        self._create_embeddings()
+        self._unindex_rows(removed_rows)
         
-        # Save updated documents
-        self._save_documents()
-        
-        return True
+        # Remove the documents from storage
+        self.document_store.delete(doc_ids)
 
     def get_document_list(self):
         """Get a list of all documents organized by source"""
+        self.refresh()
         document_list = {}
         
-        for doc in self.documents:
+        for doc in self.documents.values():
             source = doc['source']
             if source not in document_list:
                 document_list[source] = []
@@ -176,53 +351,46 @@ class RAGEngine:
         
         return pdf_files
     
-    def _extract_text_from_pdf(self, pdf_path):
-        """Extract text content from a PDF file"""
-        text = ""
+    def _extract_pages_from_pdf(self, pdf_path):
+        """Extract the text of each page of a PDF file"""
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text += page.extract_text() + " "
-            return text
+            return self.pdf_extractor.extract_pages(pdf_path)
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
-            return ""
-    
-    def _chunk_text(self, text, chunk_size=1000, overlap=200):
-        """Split text into overlapping chunks for better context preservation"""
-        words = text.split()
-        chunks = []
-        
-        if len(words) <= chunk_size:
-            return [text]
-            
-        i = 0
-        while i < len(words):
-            chunk = " ".join(words[i:i+chunk_size])
-            chunks.append(chunk)
-            i += (chunk_size - overlap)
-            
-        return chunks
+            return []
             
     def _load_or_create_embeddings(self):
-        """Load existing embeddings or create new ones"""
+        """Load the stored index, refitting only if it was built from different documents"""
         try:
-            if os.path.exists(self.embedding_path) and len(self.documents) > 0:
-                # Load existing embeddings
-                loaded = np.load(self.embedding_path)
-                stored_embeddings = loaded['embeddings']
+            if self.embedding_store.exists() and len(self._documents) > 0:
+                # Memory-mapped matrix and postings, the fitted retriever, fingerprint and
+                # any incremental changes come from the store (older layouts load as None)
+                stored = self.embedding_store.load()
+                current_fingerprint = self._fingerprint()
                 
-                # Check if number of embeddings matches number of documents
-                if len(stored_embeddings) == len(self.documents):
-                    self.embeddings = stored_embeddings
-                    # Make sure vectorizer is fitted even when loading embeddings
-                    texts = [doc['content'] for doc in self.documents]
-                    self.vectorizer.fit(texts)
-                    print(f"Loaded embeddings with shape {self.embeddings.shape}")
-                else:
-                    print("Number of embeddings doesn't match number of documents. Recreating...")
+                if stored is None or stored.retriever is None:
+                    print("Stored index has no fitted retriever. Recreating...")
+                    self._create_embeddings()
+                elif stored.retriever.name != RETRIEVER:
+                    print(f"Stored index was built for the {stored.retriever.name} retriever, not {RETRIEVER}. Recreating...")
                     self._create_embeddings()
+                elif stored.fingerprint != current_fingerprint:
+                    print("Stored index doesn't match the current documents. Recreating...")
+                    self._create_embeddings()
+                else:
+                    # The store records the document of every row; tombstoned rows have none
+                    self.index.restore(stored)
+                    tombstones = self.index.tombstones
+                    self._set_rows({
+                        doc_id: row for row, doc_id in enumerate(stored.row_ids.tolist()) if not tombstones[row]
+                    })
+                    if not self._restore_dense():
+                        print("No saved dense model for the configured encoder. Recreating...")
+                        self._create_embeddings()
+                        return
+                    self._publish()
+                    print(f"Loaded embeddings with shape {(self.index.n_rows, stored.embeddings.shape[1])} (memory-mapped)")
+                    self._schedule_compaction()
             else:
                 # Create new embeddings
                 self._create_embeddings()
@@ -230,135 +398,315 @@ class RAGEngine:
             print(f"Error with embeddings: {e}")
             self._create_embeddings()
     
+    def _restore_dense(self):
+        """Rebuild the dense rows for the restored lexical rows; False if it needs a full build"""
+        if self.dense is None:
+            return True
+        
+        # Vectors come from the embedding cache by content hash; only uncached chunks are read and encoded
+        row_hashes = [doc['content_hash'] if doc is not None else None for doc in self._row_docs]
+        def load_texts(rows):
+            return list(self.document_store.iter_contents([self._row_docs[row]['id'] for row in rows]))
+        return self.dense.restore(row_hashes, load_texts)
+    
+    def _fingerprint(self):
+        """Fingerprint of the current documents (IDs and content hashes)"""
+        return fingerprint([self._digest_sum])
+    
+    def _set_rows(self, doc_rows):
+        """Rebuild the ID -> row and row -> document indexes"""
+        self.doc_rows = dict(doc_rows)
+        self._row_docs = [None] * self.index.n_rows
+        for doc_id, row in self.doc_rows.items():
+            self._row_docs[row] = self._documents[doc_id]
+    
+    def _publish(self):
+        """Make the writer state visible to searches as a new snapshot.
+        
+        Searches keep the snapshot they started with, so they never pair an
+        index state with rows or documents from before or after it. Called once
+        the index files are written, so the snapshot matches their signature.
+        """
+        self._index_signature = self.embedding_store.signature()
+        self.snapshot = IndexSnapshot(
+            MappingProxyType(dict(self._documents)),
+            tuple(self._row_docs),
+            self.index.state,
+            self.snapshot.generation + 1,
+            self.dense.state if self.dense is not None else None,
+        )
+    
     def _create_embeddings(self):
-        """Create embeddings for all documents using TF-IDF"""
-        if not self.documents:
+        """Create embeddings for all documents with the configured retriever (and dense encoder)"""
+        if not self._documents:
             print("No documents to create embeddings for")
-            self.embeddings = np.array([])
+            self.embedding_store.clear()
+            self.index.clear()
+            if self.dense is not None:
+                self.dense.clear()
+            self._set_rows({})
+            self._publish()
             return
         
-        # Extract text content from documents
-        texts = [doc['content'] for doc in self.documents]
+        # Stream text content from the document store
+        texts = list(self.document_store.iter_contents(list(self._documents)))
+        
+        # Fit the retriever and keep the matrix sparse; the fitted vocabulary and a
+        # fingerprint of the documents are saved with it
+        self.index.fit(texts, self._fingerprint(), list(self._documents))
+        if self.dense is not None:
+            self.dense.fit(texts)
+        self._set_rows({doc_id: row for row, doc_id in enumerate(self._documents)})
+        self._publish()
+        print(f"Created and saved {self.embeddings.shape[0]} embeddings ({self.embeddings.nnz} non-zeros)")
+    
+    def _index_documents(self, documents):
+        """Add embeddings for documents that were just added to the collection"""
+        if not documents:
+            return
         
-        # Create TF-IDF embeddings
-        self.vectorizer = TfidfVectorizer()
-        self.vectorizer.fit(texts)
-        self.embeddings = self.vectorizer.transform(texts).toarray()
+        if not self.incremental or not self.index.is_fitted:
+            self._create_embeddings()
+            return
         
-        # Save embeddings
-        np.savez(self.embedding_path, embeddings=self.embeddings)
-        print(f"Created and saved {len(self.embeddings)} embeddings")
+        # Vectorize only the new documents under the current vocabulary
+        texts = [doc['content'] for doc in documents]
+        rows = self.index.append(texts, [doc['id'] for doc in documents])
+        if self.dense is not None:
+            self.dense.append(texts)
+        for document, row in zip(documents, rows):
+            self.doc_rows[document['id']] = row
+            self._row_docs.append(self._documents[document['id']])
+        self._persist_index()
     
-    def add_document(self, title, content, source='university_data'):
-        """Add a new document to the collection"""
-        doc_id = len(self.documents)
-        document = {
-            'id': doc_id,
-            'title': title,
-            'content': content,
-            'source': source
-        }
-        
-        self.documents.append(document)
+    def _unindex_rows(self, rows):
+        """Drop the embedding rows of documents that were just removed from the collection"""
+        if not self.incremental:
+            self._create_embeddings()
+            return
         
-        # Update embeddings with the new document
-        self._create_embeddings()
+        # Tombstone the rows; they stay in the matrix until the next compaction
+        self.index.delete(rows)
+        if self.dense is not None:
+            self.dense.delete(rows)
+        for row in rows:
+            self._row_docs[row] = None
+        self._persist_index()
+    
+    def _persist_index(self):
+        """Save and publish incremental index changes, and compact in the background when needed"""
+        self.index.persist(self._fingerprint())
+        self._publish()
+        self._schedule_compaction()
+    
+    def _schedule_compaction(self):
+        """Start a background refit if vocabulary drift or tombstones passed their thresholds"""
+        if not self.index.needs_compaction():
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
         
-        # Save updated documents
-        self._save_documents()
+        print(f"Index drift {self.index.drift:.1%}, tombstones {self.index.tombstone_ratio:.1%}. Compacting in background...")
+        self._compaction_thread = threading.Thread(target=self._compact, daemon=True)
+        self._compaction_thread.start()
+    
+    def _compact(self):
+        """Refit the index over the live documents, dropping tombstoned rows"""
+        with self._editing():
+            try:
+                # Another worker may have compacted already
+                if self.index.needs_compaction():
+                    self._create_embeddings()
+            except Exception as e:
+                print(f"Error compacting index: {e}")
+    
+    def add_document(self, title, content, source='university_data'):
+        """Add a new document to the collection"""
+        with self._editing():
+            # Save the new document, then update embeddings with it
+            document = self._store_documents([self._new_document(title, content, source)])[0]
+            self._index_documents([document])
         
-        return doc_id
+        return document['id']
     
-    def upload_pdf(self, pdf_file, filename=None):
-        """Upload and process a new PDF file"""
+    def stage_upload(self, pdf_file, filename=None):
+        """Save an uploaded PDF to a staging file and return (filename, staging path)"""
         if not filename:
             # Generate unique filename if not provided
-            file_hash = hashlib.md5(pdf_file.read()).hexdigest()[:8]
+            name_hash = hashlib.md5(pdf_file.read()).hexdigest()[:8]
             pdf_file.seek(0)  # Reset file pointer after reading
-            filename = f"{file_hash}_{pdf_file.filename}"
+            filename = f"{name_hash}_{pdf_file.filename}"
         
-        # Save PDF to pdf directory
-        pdf_path = os.path.join(self.pdf_dir, filename)
-        pdf_file.save(pdf_path)
+        upload_path = os.path.join(self.pdf_dir, f"{filename}.{uuid.uuid4().hex}.upload")
+        pdf_file.save(upload_path)
+        return filename, upload_path
+    
+    def ingest_pdf(self, upload_path, filename, progress=None):
+        """Index a staged PDF upload.
         
-        # Process the new PDF
-        self._process_pdfs()
+        Extraction and chunking happen before the live collection is touched, so
+        searches keep using the current documents and index until the new chunks
+        are swapped in at the end. `progress` is called with the name of each stage.
+        """
+        timings = {'extract': 0.0, 'chunk': 0.0, 'vectorize': 0.0}
+        pdf_path = os.path.join(self.pdf_dir, filename)
+        pdf_id = f"pdf:{filename}"
         
-        # Update embeddings
-        self._create_embeddings()
+        with self._editing():
+            indexed_chunks = len(self.source_docs.get(pdf_id, ()))
+        if indexed_chunks and os.path.exists(pdf_path) and file_hash(pdf_path) == file_hash(upload_path):
+            # Same file uploaded again; nothing to re-index
+            os.remove(upload_path)
+            print(f"PDF {filename} is unchanged, skipping re-indexing")
+            return {'filename': filename, 'chunks': indexed_chunks, 'timings': timings}
         
-        return filename
-    
-    def _save_documents(self):
-        """Save documents to JSON file"""
-        with open(self.data_path, 'w', encoding='utf-8') as f:
-            json.dump({'documents': self.documents}, f, indent=2)
+        try:
+            chunks = self._read_pdf_chunks(upload_path, timings, progress)
+        except Exception:
+            os.remove(upload_path)
+            raise
+        
+        if progress:
+            progress('indexing')
+        with self._editing():
+            start = time.perf_counter()
+            replaced_ids = list(self.source_docs.get(pdf_id, ()))
+            os.replace(upload_path, pdf_path)
+            
+            # Save and index the new chunks
+            documents = self._store_documents(self._add_pdf_chunks(filename, chunks))
+            self._index_documents(documents)
+            
+            # A replaced file's old chunks go only once the new ones are searchable
+            if replaced_ids:
+                self._remove_documents(replaced_ids)
+            timings['vectorize'] = time.perf_counter() - start
+        
+        stage_times = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items())
+        print(f"Ingested {filename} into {len(chunks)} chunks: {stage_times}")
+        return {'filename': filename, 'chunks': len(chunks), 'timings': timings}
     
     def search(self, query, top_k=5):
         """Search for most relevant documents to the query"""
-        if not self.documents or self.embeddings.size == 0:
-            return []
-
-        # Ensure vectorizer is fitted
-        if not hasattr(self.vectorizer, 'vocabulary_') or self.vectorizer.vocabulary_ is None:
-            texts = [doc['content'] for doc in self.documents]
-            self.vectorizer.fit(texts)
-
-        # Create query embedding
-        query_embedding = self.vectorizer.transform([query]).toarray()
-        
-        # Calculate similarity
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-        
-        # Get top k results
-        top_indices = similarities.argsort()[-top_k:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            # Only include documents with some relevance
-            if similarities[idx] > 0.1:  # Threshold can be adjusted
-                results.append({
-                    'document': self.documents[idx],
-                    'similarity': float(similarities[idx])
-                })
-        
+        return self.search_batch([query], top_k)[0]
+    
+    def search_batch(self, queries, top_k=5):
+        """Search for several queries at once; returns one result list per query"""
+        # Serve repeated queries from the cache; the key includes the index
+        # generation of the snapshot searched, so edits make older entries unreachable.
+        # Searches take no lock: they read one snapshot throughout
+        self.refresh()
+        snapshot = self.snapshot
+        keys = [self._retrieval_key(snapshot, query, top_k) for query in queries]
+        results = [self.retrieval_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self._search_uncached(snapshot, [queries[i] for i in missing], top_k)
+            for i, result in zip(missing, computed):
+                results[i] = result
+                self.retrieval_cache.put(keys[i], result)
+        note(retrieval_cache_hits=len(queries) - len(missing))
         return results
     
-    def generate_response(self, query, conversation_history=None, system_prompt="You are BotMIT, a helpful University Assistant."):
-        """Generate a response using RAG with conversation context"""
+    @staticmethod
+    def _retrieval_key(snapshot, query, top_k):
+        """Retrieval cache key: queries that normalize the same get the same results"""
+        encoder = snapshot.dense_state.encoder if snapshot.dense_state is not None else None
+        if encoder is not None and encoder.order_sensitive:
+            # The dense ranking changes with word order and case, so only whitespace is normalized
+            return (normalize_whitespace(query), encoder.model_id, top_k, snapshot.generation)
+        # TF-IDF, BM25 and LSA score a bag of words
+        return (normalize_query(query), top_k, snapshot.generation)
+    
+    def _search_uncached(self, snapshot, queries, top_k):
+        # The retriever is always fitted whenever there are embeddings to search
+        row_docs = snapshot.row_docs
+        if not snapshot.documents or not row_docs:
+            return [[] for _ in queries]
+
+        # The retriever weights rows and queries so that one sparse product of the
+        # query matrix with the postings gives every score (cosine similarity for
+        # TF-IDF, scaled BM25); only rows sharing a term with a query are scored,
+        # tombstoned rows and scores below the retriever's threshold are skipped
+        # and only the top_k are sorted
+        batch = self.index.search_batch(queries, top_k, state=snapshot.index_state)
+        if snapshot.dense_state is not None:
+            # Dense neighbours also catch chunks that word the question differently. Both
+            # rankings are merged by reciprocal rank, which becomes the similarity
+            dense = self.dense.search_batch(queries, top_k, state=snapshot.dense_state)
+            batch = [reciprocal_rank_fusion(pair, top_k) for pair in zip(batch, dense)]
+        
+        hits = [
+            [
+                (row_docs[row]['id'], float(similarity))
+                for row, similarity in zip(rows, similarities)
+                if row_docs[row] is not None
+            ]
+            for rows, similarities in batch
+        ]
+        
+        # Load content for the hits of all queries in one go
+        documents = self.document_store.get_many({doc_id for query_hits in hits for doc_id, _ in query_hits})
+        
+        return [
+            [
+                {'document': documents[doc_id], 'similarity': similarity}
+                for doc_id, similarity in query_hits
+                if doc_id in documents
+            ]
+            for query_hits in hits
+        ]
+    
+    def _build_prompt(self, query, conversation_history=None, system_prompt="You are BotMIT, a helpful University Assistant."):
+        """Retrieve context for the query; returns the full LLM prompt and the documents used"""
         # Default to empty list if history not provided
         if conversation_history is None:
             conversation_history = []
         
-        # Step 1: Construct context from conversation history
+        # Step 1: Construct context from the last 3 exchanges, newest first within the history
+        # budget. Bot turns use the markdown answer, not the HTML shown in the page
+        turns = []
+        budget = HISTORY_TOKEN_BUDGET
+        for exchange in reversed(conversation_history[-3:]):
+            if budget <= 0:
+                break
+            speaker = "User" if exchange.get('sender') == 'user' else "BotMIT"
+            text = exchange.get('raw_text') or exchange.get('text') or ""
+            text = trim_to_tokens(text, budget)
+            budget -= estimate_tokens(text)
+            turns.append(f"{speaker}: {text}\n")
         conversation_context = ""
-        if conversation_history:
-            conversation_context = "Previous conversation:\n"
-            for i, exchange in enumerate(conversation_history[-3:]):  # Use last 3 exchanges for context
-                if exchange.get('sender') == 'user':
-                    conversation_context += f"User: {exchange.get('text')}\n"
-                else:
-                    conversation_context += f"BotMIT: {exchange.get('text')}\n"
-            conversation_context += "-" * 40 + "\n"
-        
-        # Step 2: Retrieve relevant documents for the current query
-        relevant_docs = self.search(query)
-        
-        # Step 3: If no docs are found, also try searching with the last question context
-        if not relevant_docs and len(conversation_history) >= 2:
-            # Get the last user question
-            last_user_messages = [msg for msg in conversation_history if msg.get('sender') == 'user']
-            if last_user_messages:
-                last_question = last_user_messages[-1].get('text', '')
-                # Create combined query
-                combined_query = f"{last_question} {query}"
-                relevant_docs = self.search(combined_query)
-        
-        # Step 4: Format document context from retrieved documents
+        if turns:
+            conversation_context = "Previous conversation:\n" + "".join(reversed(turns)) + "-" * 40 + "\n"
+        
+        # Step 2: Also prepare a query combining the previous question with this one,
+        # used when the current query alone finds nothing
+        queries = [query]
+        earlier_questions = self._earlier_questions(query, conversation_history)
+        if earlier_questions:
+            queries.append(f"{earlier_questions[-1].get('text', '')} {query}")
+        
+        # Step 3: Retrieve relevant documents for both in one batch, preferring the current query
+        with timed('search'):
+            results = self.search_batch(queries)
+        hits = results[0]
+        outcome = 'direct'
+        if not hits and len(results) > 1:
+            hits = results[1]
+            outcome = 'fallback'
+        if not hits:
+            outcome = 'empty'
+        RETRIEVALS.inc(outcome=outcome)
+        
+        # Step 4: Pack the query-relevant sentences of the best hits into the token budget,
+        # without repeating the overlap between neighbouring chunks
+        with timed('context'):
+            relevant_docs, stats = self.context_builder.build(query, hits)
+        note(retrieval=outcome, hits=stats['hits'], passages=stats['passages'], context_tokens=stats['context_tokens'])
         doc_context = ""
         for i, doc in enumerate(relevant_docs):
             doc_context += f"\nDocument {i+1}: {doc['document']['title']}\n"
-            doc_context += f"{doc['document']['content']}\n"
+            doc_context += f"{doc['text']}\n"
             doc_context += "-" * 40 + "\n"
         
         # Step 5: Create prompt with conversation history and document context
@@ -367,14 +715,96 @@ class RAGEngine:
         else:
             full_prompt = f"{system_prompt}\n\n{conversation_context}\nCurrent User Question: {query}\n\nI don't have specific university data to answer this question. Please respond based on the conversation context if relevant, or inform the user that you don't have the information they're looking for. You can add emojis to make the response more engaging, Also try to answer breif below 100 words."
         
+        print(f"Prompt: ~{estimate_tokens(full_prompt)} tokens "
+              f"({stats['context_tokens']}/{self.context_builder.token_budget} context tokens from "
+              f"{stats['passages']} of {stats['hits']} hits, {stats['duplicate_sentences']} repeated sentences "
+              f"dropped; ~{HISTORY_TOKEN_BUDGET - budget} history tokens)")
+        return full_prompt, relevant_docs
+    
+    @staticmethod
+    def _earlier_questions(query, conversation_history):
+        """User turns before the current question"""
+        # The chat route adds the current question to the history before answering
+        user_turns = [msg for msg in conversation_history or [] if msg.get('sender') == 'user']
+        if user_turns and user_turns[-1].get('text') == query:
+            user_turns = user_turns[:-1]
+        return user_turns
+    
+    def _answer_cache_key(self, query, conversation_history, system_prompt, relevant_docs):
+        """Answer cache key for a standalone question, or None if earlier turns could shape the answer"""
+        question = normalize_question(query)
+        if self._earlier_questions(query, conversation_history) or not question:
+            return None
+        
+        # Document IDs are never reused and documents never change under an ID, so
+        # once a source document is deleted or replaced its entries can't be hit again
+        return (question, tuple(doc['document']['id'] for doc in relevant_docs), system_prompt)
+    
+    def _cached_answer(self, cache_key):
+        """Return a cached answer and count the LLM time it saved, or None"""
+        if cache_key is None:
+            return None
+        cached = self.answer_cache.get(cache_key)
+        if cached is None:
+            note(answer_cache='miss')
+            return None
+        answer, seconds = cached
+        with self._seconds_saved_lock:
+            self.answer_seconds_saved += seconds
+        ANSWERS.inc(source='cache')
+        note(answer_cache='hit')
+        return answer
+    
+    def generate_response(self, query, conversation_history=None, system_prompt="You are BotMIT, a helpful University Assistant."):
+        """Generate a response using RAG with conversation context"""
+        full_prompt, relevant_docs = self._build_prompt(query, conversation_history, system_prompt)
+        
+        # Standalone questions already answered from the same documents skip the LLM
+        cache_key = self._answer_cache_key(query, conversation_history, system_prompt, relevant_docs)
+        answer = self._cached_answer(cache_key)
+        if answer is not None:
+            return answer
+        
         try:
-            # Step 6: Generate response using Gemini
-            model_name = "gemini-1.5-flash"
-            
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(full_prompt)
-            return response.text
+            # Step 6: Generate response through the shared LLM client
+            start = time.perf_counter()
+            with timed('llm'):
+                answer = self.llm.generate(full_prompt)
+            if cache_key is not None:
+                self.answer_cache.put(cache_key, (answer, time.perf_counter() - start))
+            ANSWERS.inc(source='llm')
+            return answer
             
         except Exception as e:
             print(f"Error generating response: {e}")
-            return f"I'm having trouble connecting to my knowledge base. Please try again later. Technical details: {str(e)}"
\ No newline at end of file
+            ANSWERS.inc(source='error')
+            note(llm_error=type(e).__name__)
+            return f"I'm having trouble connecting to my knowledge base. Please try again later. Technical details: {str(e)}"
+    
+    def stream_response(self, query, conversation_history=None, system_prompt="You are BotMIT, a helpful University Assistant."):
+        """Like generate_response, but yields the answer in pieces as the LLM produces them"""
+        full_prompt, relevant_docs = self._build_prompt(query, conversation_history, system_prompt)
+        
+        cache_key = self._answer_cache_key(query, conversation_history, system_prompt, relevant_docs)
+        answer = self._cached_answer(cache_key)
+        if answer is not None:
+            yield answer
+            return
+        
+        try:
+            # Time from the call to the last piece, including the time spent sending the pieces on
+            start = time.perf_counter()
+            parts = []
+            with timed('llm'):
+                for text in self.llm.stream(full_prompt):
+                    parts.append(text)
+                    yield text
+            if cache_key is not None:
+                self.answer_cache.put(cache_key, ("".join(parts), time.perf_counter() - start))
+            ANSWERS.inc(source='llm')
+        
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            ANSWERS.inc(source='error')
+            note(llm_error=type(e).__name__)
+            yield f"I'm having trouble connecting to my knowledge base. Please try again later. Technical details: {str(e)}"
@@ -0,0 +1,103 @@
+# backend/registry.py
+import os
+import threading
+import time
+
+
+class EngineRegistry:
+    """Builds the RAG engine on first use, once per process, and reports warm-up state.
+
+    Nothing heavy happens at import time: the factory imports scikit-learn,
+    PyPDF2 and the LLM client and loads the index, so pages that don't need the
+    engine (admin login, health checks) are served while it warms up.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.state = 'cold'  # cold -> warming -> ready | failed
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self._engine = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        self._pid = os.getpid()
+
+    def get(self):
+        """The engine, built by the first caller; concurrent callers wait for that build"""
+        self._check_fork()
+        engine = self._engine
+        if engine is not None:
+            return engine
+        with self._lock:
+            if self._engine is None:
+                self._build()
+            return self._engine
+
+    def warm_up(self):
+        """Start building the engine on a background thread, if nobody has yet"""
+        self._check_fork()
+        if self.state != 'cold':
+            return
+
+        def build():
+            try:
+                self.get()
+            except Exception:
+                pass  # Recorded in the status; the next get() retries
+
+        self.state = 'warming'
+        self._warmup_thread = threading.Thread(target=build, name='engine-warmup', daemon=True)
+        self._warmup_thread.start()
+
+    def wait(self):
+        """Block until a background warm-up has finished, without starting one"""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+
+    def status(self):
+        """Warm-up state for the readiness endpoint"""
+        self._check_fork()
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.ready_at or time.monotonic()) - self.started_at
+        return {
+            'state': self.state,
+            'ready': self.state == 'ready',
+            'warmup_seconds': elapsed,
+            'error': self.error,
+            'pid': os.getpid(),
+        }
+
+    def _build(self):
+        self.state = 'warming'
+        self.error = None
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        try:
+            engine = self.factory()
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            print(f"Engine warm-up failed: {e}")
+            raise
+        self.ready_at = time.monotonic()
+        self._engine = engine
+        self.state = 'ready'
+        print(f"Engine ready in {self.ready_at - self.started_at:.2f}s (pid {os.getpid()})")
+
+    def _check_fork(self):
+        """After a fork, keep a finished engine but forget a build the child didn't inherit.
+
+        A master that forked while a warm-up thread was running leaves the child
+        with a held lock and no thread to release it (gunicorn.conf.py waits for
+        the warm-up before forking to avoid that).
+        """
+        if os.getpid() == self._pid:
+            return
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        if self._engine is None:
+            self.state = 'cold'
+            self.started_at = None
@@ -0,0 +1,54 @@
+# backend/rendering.py
+import hashlib
+import threading
+import bleach
+import markdown
+from app.backend.cache import LRUCache
+
+# Configure allowed HTML tags and attributes for safe markdown rendering
+ALLOWED_TAGS = frozenset([
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br', 'hr',
+    'em', 'strong', 'del', 'ul', 'ol', 'li', 'dl', 'dt', 'dd',
+    'blockquote', 'code', 'pre', 'a', 'img', 'table', 'thead', 'tbody',
+    'tr', 'th', 'td', 'sup', 'sub'
+])
+
+ALLOWED_ATTRS = {
+    '*': ['class'],
+    'a': ['href', 'title', 'target'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'th': ['scope', 'colspan', 'rowspan'],
+    'td': ['colspan', 'rowspan']
+}
+
+
+class MarkdownRenderer:
+    """Markdown to sanitized HTML, cached by a hash of the markdown.
+
+    The Markdown converter and bleach Cleaner are configured once and reused;
+    neither is thread-safe, so each thread gets its own pair.
+    """
+
+    def __init__(self, cache_size=1024):
+        self.cache = LRUCache(cache_size)
+        self._local = threading.local()
+
+    def _converters(self):
+        converters = getattr(self._local, 'converters', None)
+        if converters is None:
+            converters = (
+                markdown.Markdown(extensions=['extra', 'nl2br']),
+                bleach.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS),
+            )
+            self._local.converters = converters
+        return converters
+
+    def render(self, text):
+        key = hashlib.sha256(text.encode('utf-8')).digest()
+        html = self.cache.get(key)
+        if html is None:
+            md, cleaner = self._converters()
+            # Sanitize HTML to prevent XSS attacks
+            html = cleaner.clean(md.reset().convert(text))
+            self.cache.put(key, html)
+        return html
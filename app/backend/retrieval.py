@@ -0,0 +1,177 @@
+# backend/retrieval.py
+import numpy as np
+from scipy import sparse
+
+
+def _max_per_term(postings):
+    """Highest weight in each posting list (row of a terms x rows CSR matrix)"""
+    max_weight = np.zeros(postings.shape[0], dtype=np.float32)
+    non_empty = np.diff(postings.indptr) > 0
+    if non_empty.any():
+        max_weight[non_empty] = np.maximum.reduceat(postings.data, postings.indptr[:-1][non_empty])
+    return max_weight
+
+
+class InvertedIndex:
+    """Term -> posting list view of an L2-normalized embedding matrix.
+
+    The postings are stored as a (terms x rows) CSR matrix, so multiplying a
+    batch of query vectors by it only touches the posting lists of the query
+    terms: scoring cost depends on how many rows share a term with a query
+    rather than on corpus size.
+
+    Rows appended after the base was built live in a small separate `delta`
+    segment, so the base arrays can stay memory-mapped and shared.
+    """
+
+    def __init__(self, postings, max_weight, delta=None):
+        self.postings = postings
+        # Highest weight in each posting list, for the early-exit bound
+        self.max_weight = max_weight
+        self.delta = delta
+
+    @classmethod
+    def build(cls, embeddings):
+        postings = sparse.csr_matrix(embeddings.T)
+        return cls(postings, _max_per_term(postings))
+
+    def extend(self, rows):
+        """Return an index that also covers rows appended after the existing ones"""
+        appended = sparse.csr_matrix(rows.T, dtype=np.float32)
+        if self.delta is not None:
+            appended = sparse.hstack([self.delta, appended], format='csr')
+        return InvertedIndex(self.postings, np.maximum(self.max_weight, _max_per_term(appended)), appended)
+
+    def search(self, query_vector, top_k, threshold=0.0, tombstones=None):
+        """Return (rows, scores) of the best top_k rows scoring above threshold, best first"""
+        return self.search_batch(query_vector, top_k, threshold, tombstones)[0]
+
+    def search_batch(self, query_matrix, top_k, threshold=0.0, tombstones=None):
+        """Like search, for every row of a query matrix, scored with a single sparse product"""
+        query_matrix = query_matrix.astype(np.float32).tocsr()
+
+        # No row can score more than the sum of each term's best weight; drop
+        # the queries that can't reach the threshold before multiplying
+        reachable = query_matrix @ self.max_weight > threshold
+        if not reachable.all():
+            query_matrix = sparse.diags(reachable.astype(np.float32)) @ query_matrix
+        scores = query_matrix @ self.postings
+        if self.delta is not None:
+            scores = sparse.hstack([scores, query_matrix @ self.delta])
+        scores = scores.tocsr()
+
+        results = []
+        for i in range(scores.shape[0]):
+            start, stop = scores.indptr[i], scores.indptr[i + 1]
+            results.append(_best(scores.indices[start:stop], scores.data[start:stop], top_k, threshold, tombstones))
+        return results
+
+
+def _best(candidates, similarities, top_k, threshold, tombstones):
+    """(rows, scores) of the top_k live candidates scoring above threshold, best first"""
+    keep = similarities > threshold
+    if tombstones is not None:
+        keep &= ~tombstones[candidates]
+    candidates, similarities = candidates[keep], similarities[keep]
+
+    # Partial selection of the top_k, then sort only those
+    if len(similarities) > top_k:
+        best = np.argpartition(-similarities, top_k - 1)[:top_k]
+        candidates, similarities = candidates[best], similarities[best]
+    order = np.argsort(-similarities, kind='stable')
+    return candidates[order], similarities[order]
+
+
+class IVFIndex:
+    """Inverted-file index over L2-normalized dense vectors.
+
+    Rows are clustered around k-means `centroids` and stored list by list, so
+    a query compared with the centroids only scores the rows of its `nprobe`
+    closest lists: the cost grows with the list size rather than corpus size,
+    at the price of missing neighbours that fall in other lists. Without
+    centroids every row is scored (exact search, for small corpora).
+
+    Rows appended after the build live in a separate `delta` segment that is
+    always scanned, like the delta of InvertedIndex, until the next build.
+    """
+
+    def __init__(self, vectors, list_rows, list_offsets, centroids=None, delta=None):
+        # Vectors in list order; list l is vectors[list_offsets[l]:list_offsets[l + 1]],
+        # holding the rows list_rows[list_offsets[l]:list_offsets[l + 1]]
+        self.vectors = vectors
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+        self.centroids = centroids
+        self.delta = delta
+
+    @property
+    def n_rows(self):
+        return self.vectors.shape[0] + (0 if self.delta is None else self.delta.shape[0])
+
+    @classmethod
+    def build(cls, vectors, n_lists=0, centroids=None):
+        """Cluster vectors into n_lists lists (0 for exact search), or assign them to existing centroids"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if centroids is None and n_lists > 1 and len(vectors) > n_lists:
+            from sklearn.cluster import MiniBatchKMeans
+            kmeans = MiniBatchKMeans(n_lists, batch_size=4096, n_init=3, random_state=0).fit(vectors)
+            centroids = kmeans.cluster_centers_.astype(np.float32)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        if centroids is None:
+            return cls(vectors, np.arange(len(vectors)), np.array([0, len(vectors)]))
+
+        assignments = np.argmax(vectors @ centroids.T, axis=1) if len(vectors) else np.zeros(0, dtype=np.int64)
+        list_rows = np.argsort(assignments, kind='stable')
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(vectors[list_rows], list_rows, list_offsets, centroids)
+
+    def extend(self, rows):
+        """Return an index that also covers rows appended after the existing ones"""
+        rows = np.asarray(rows, dtype=np.float32)
+        delta = rows if self.delta is None else np.vstack([self.delta, rows])
+        return IVFIndex(self.vectors, self.list_rows, self.list_offsets, self.centroids, delta)
+
+    def search_batch(self, query_matrix, top_k, threshold=0.0, tombstones=None, nprobe=8):
+        """(rows, scores) of the best top_k rows above threshold for every query row, best first"""
+        query_matrix = np.asarray(query_matrix, dtype=np.float32)
+        base_rows = self.vectors.shape[0]
+        delta_scores = None if self.delta is None else self.delta @ query_matrix.T
+        delta_rows = np.arange(base_rows, self.n_rows)
+        if self.centroids is None:
+            base_scores = self.vectors @ query_matrix.T
+        else:
+            nprobe = min(nprobe, len(self.centroids))
+            probes = np.argpartition(-(query_matrix @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for i, query in enumerate(query_matrix):
+            if self.centroids is None:
+                candidates, similarities = self.list_rows, base_scores[:, i]
+            else:
+                spans = [slice(self.list_offsets[l], self.list_offsets[l + 1]) for l in probes[i]]
+                candidates = np.concatenate([self.list_rows[span] for span in spans])
+                similarities = np.concatenate([self.vectors[span] @ query for span in spans])
+            if delta_scores is not None:
+                candidates = np.concatenate([candidates, delta_rows])
+                similarities = np.concatenate([similarities, delta_scores[:, i]])
+            results.append(_best(candidates, similarities, top_k, threshold, tombstones))
+        return results
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=60):
+    """Merge (rows, scores) rankings of the same rows into one.
+
+    Each row scores the sum of 1 / (k + rank) over the rankings it appears
+    in, so rows found by several rankings come first whatever the scale of
+    their original scores.
+    """
+    fused = {}
+    for rows, _ in rankings:
+        for rank, row in enumerate(rows.tolist()):
+            fused[row] = fused.get(row, 0.0) + 1 / (k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+    return (
+        np.array([row for row, _ in best], dtype=np.int64),
+        np.array([score for _, score in best], dtype=np.float32),
+    )
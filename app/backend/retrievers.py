@@ -0,0 +1,179 @@
+# backend/retrievers.py
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from config import RETRIEVAL_THRESHOLD, BM25_K1, BM25_B
+
+
+class Retriever:
+    """Interface for lexical scoring backends over the inverted index.
+
+    A retriever turns document texts into index rows and queries into query
+    vectors whose sparse product with those rows is the relevance score, so
+    every backend is served by the same InvertedIndex. It is fitted on the
+    corpus at each full build; documents added later are weighted with the
+    statistics of that fit until the next one. `vocabulary_` exists once fitted.
+
+    `threshold` is the lowest score counted as a hit, on each backend's own scale.
+    """
+
+    name = None
+    default_threshold = 0.1
+
+    def __init__(self, threshold=None):
+        self.threshold = self.default_threshold if threshold is None else threshold
+
+    def fit_transform(self, texts):
+        """Fit the corpus statistics and return the rows of texts"""
+        raise NotImplementedError
+
+    def transform(self, texts):
+        """Rows of documents added after the fit"""
+        raise NotImplementedError
+
+    def transform_queries(self, queries):
+        raise NotImplementedError
+
+    def build_analyzer(self):
+        """The function splitting a text into the terms of the vocabulary"""
+        raise NotImplementedError
+
+    def state(self):
+        """(terms ordered by column, per-term weights, other parameters) to persist a fitted retriever"""
+        raise NotImplementedError
+
+
+class TfidfRetriever(Retriever):
+    """TF-IDF rows, L2-normalized: the score is the cosine similarity with the query"""
+
+    name = 'tfidf'
+
+    def __init__(self, threshold=None):
+        super().__init__(threshold)
+        self.vectorizer = TfidfVectorizer()
+
+    @property
+    def vocabulary_(self):
+        return self.vectorizer.vocabulary_
+
+    def fit_transform(self, texts):
+        return self.vectorizer.fit_transform(texts)
+
+    def transform(self, texts):
+        return self.vectorizer.transform(texts)
+
+    def transform_queries(self, queries):
+        return self.vectorizer.transform(queries)
+
+    def build_analyzer(self):
+        return self.vectorizer.build_analyzer()
+
+    def state(self):
+        terms = np.array(self.vectorizer.get_feature_names_out(), dtype=str)
+        return terms, np.asarray(self.vectorizer.idf_, dtype=np.float64), {}
+
+    @classmethod
+    def restore(cls, terms, weights, params, threshold=None):
+        retriever = cls(threshold)
+        retriever.vectorizer = restore_vectorizer(terms, weights)
+        return retriever
+
+
+class BM25Retriever(Retriever):
+    """Okapi BM25 with the per-document impact of each term precomputed in the rows.
+
+    A row holds idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+    for each term of the document, so the document lengths are applied once at
+    indexing time and a query only sums the weights of its terms. Term frequency
+    saturates with k1 and length normalization grows with b, so long chunks
+    that repeat a term don't outrank short chunks that are about it.
+
+    Scores are divided by the most a single term can contribute (the idf of a
+    term found in one document, times k1 + 1): 0.5 is about half a strong
+    match on a rare term. Queries made only of common words ("what is the",
+    "how are you") stay below it, where a scale relative to the query's own
+    terms would let them through. That maximum grows with log(documents), so
+    scores drift down on much larger corpora; retune RETRIEVAL_THRESHOLD there.
+    """
+
+    name = 'bm25'
+    default_threshold = 0.5
+
+    def __init__(self, k1=1.2, b=0.75, threshold=None):
+        super().__init__(threshold)
+        self.k1 = k1
+        self.b = b
+        self.counter = CountVectorizer(dtype=np.float32)
+        self.avg_length = 1.0
+
+    @property
+    def vocabulary_(self):
+        return self.counter.vocabulary_
+
+    def fit_transform(self, texts):
+        counts = self.counter.fit_transform(texts).tocsr()
+        n_docs = counts.shape[0]
+        doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+        self.idf_ = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        self.avg_length = float(counts.sum() / max(n_docs, 1)) or 1.0
+        return self._impacts(counts)
+
+    def transform(self, texts):
+        return self._impacts(self.counter.transform(texts).tocsr())
+
+    def _impacts(self, counts):
+        counts = sparse.csr_matrix(counts, dtype=np.float32, copy=True)
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        length_norm = self.k1 * (1 - self.b + self.b * lengths / self.avg_length)
+        tf = counts.data
+        rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        counts.data = (self.idf_[counts.indices] * tf * (self.k1 + 1) / (tf + length_norm[rows])).astype(np.float32)
+        return counts
+
+    def transform_queries(self, queries):
+        # Each distinct query term counts once
+        terms = self.counter.transform(queries).tocsr()
+        terms.data[:] = 1 / (self.idf_.max() * (self.k1 + 1))
+        return terms
+
+    def build_analyzer(self):
+        return self.counter.build_analyzer()
+
+    def state(self):
+        terms = np.array(self.counter.get_feature_names_out(), dtype=str)
+        return terms, np.asarray(self.idf_, dtype=np.float64), {'k1': self.k1, 'b': self.b, 'avg_length': self.avg_length}
+
+    @classmethod
+    def restore(cls, terms, weights, params, threshold=None):
+        retriever = cls(params['k1'], params['b'], threshold)
+        retriever.counter.vocabulary_ = {str(term): i for i, term in enumerate(terms)}
+        retriever.idf_ = np.asarray(weights, dtype=np.float64)
+        retriever.avg_length = params['avg_length']
+        return retriever
+
+
+RETRIEVERS = {retriever.name: retriever for retriever in (TfidfRetriever, BM25Retriever)}
+
+
+def restore_vectorizer(terms, idf):
+    """Rebuild a fitted TfidfVectorizer from its saved vocabulary and IDF weights"""
+    vectorizer = TfidfVectorizer()
+    vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(terms)}
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def create_retriever(name):
+    """An unfitted retriever of the configured backend"""
+    if name == 'tfidf':
+        return TfidfRetriever(RETRIEVAL_THRESHOLD)
+    if name == 'bm25':
+        return BM25Retriever(BM25_K1, BM25_B, RETRIEVAL_THRESHOLD)
+    raise ValueError(f"Unknown retriever: {name}")
+
+
+def restore_retriever(name, terms, weights, params):
+    """A fitted retriever from its persisted state, with the configured query threshold"""
+    if name not in RETRIEVERS:
+        raise ValueError(f"Unknown retriever: {name}")
+    return RETRIEVERS[name].restore(terms, weights, params, RETRIEVAL_THRESHOLD)
@@ -1,41 +1,87 @@
 # backend/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, session
-import google.generativeai as genai
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, jsonify, flash, session,
+    Response, stream_with_context, current_app,
+)
 import os
+import json
+import time
 import uuid
-from app.backend.rag_engine import RAGEngine
+from app.backend.jobs import JobQueue
+from app.backend.registry import EngineRegistry
+from app.backend.conversations import SessionConversationStore, create_conversation_store, turn
+from app.backend.rendering import MarkdownRenderer
+from app.backend import metrics
 from werkzeug.utils import secure_filename
-import bleach
-import markdown
 import re
 from functools import wraps
 import glob
-from config import ADMIN_USERNAME, check_password, GOOGLE_API_KEY
+from config import (
+    ADMIN_USERNAME, check_password, CONVERSATION_STORE, CONVERSATION_DB, CONVERSATION_MAX_TURNS,
+    CONVERSATION_TTL, CONVERSATION_GC_INTERVAL, RENDER_CACHE_SIZE,
+)
 
 chat_bp = Blueprint('chat_bp', __name__)
 
-# Set your Google API key
-google_api_key = GOOGLE_API_KEY
-genai.configure(api_key=google_api_key)
-
-# Initialize RAG engine
-rag_engine = RAGEngine()
-
-# Configure allowed HTML tags and attributes for safe markdown rendering
-allowed_tags = [
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br', 'hr',
-    'em', 'strong', 'del', 'ul', 'ol', 'li', 'dl', 'dt', 'dd',
-    'blockquote', 'code', 'pre', 'a', 'img', 'table', 'thead', 'tbody',
-    'tr', 'th', 'td', 'sup', 'sub'
-]
-
-allowed_attrs = {
-    '*': ['class'],
-    'a': ['href', 'title', 'target'],
-    'img': ['src', 'alt', 'title', 'width', 'height'],
-    'th': ['scope', 'colspan', 'rowspan'],
-    'td': ['colspan', 'rowspan']
-}
+def _create_engine():
+    """Load the sample data and build the RAG engine (imports deferred: they take seconds)"""
+    try:
+        from app.backend.utils import load_sample_data
+        load_sample_data()
+    except Exception as e:
+        print(f"Warning: Could not load sample data: {e}")
+    
+    from app.backend.rag_engine import RAGEngine
+    return RAGEngine()
+
+# The RAG engine is built on first use (or warmed up by create_app), not at import
+engine_registry = EngineRegistry(_create_engine)
+
+# PDF ingestion runs in the background so uploads don't tie up a worker.
+# Job status lives next to the default embedding store
+ingestion_jobs = JobQueue(os.path.join('embeddings_db', 'jobs'))
+
+# Chat history per session ID, kept out of the Flask session unless CONVERSATION_STORE=session
+conversations = create_conversation_store(
+    CONVERSATION_STORE, CONVERSATION_DB, CONVERSATION_MAX_TURNS, CONVERSATION_TTL, CONVERSATION_GC_INTERVAL
+)
+
+WELCOME_MESSAGE = "# Welcome to BotMIT! 👋\nI'm your university assistant. How can I help you today?"
+
+CHAT_SYSTEM_PROMPT = "You are BotMIT, a helpful University Assistant. Answer university-related questions based on the provided context. Format your responses with markdown for better readability. Use headers (# for main headings, ## for subheadings), bold (**text**) for emphasis, lists (* item) where appropriate, and other markdown formatting to make your responses clear and structured."
+
+# Answer to a chat request without a message
+EMPTY_MESSAGE_ERROR = "Error: Please enter a message."
+
+# Sanitized HTML of bot messages, cached by content hash (the welcome message,
+# repeated and cached answers, history re-shown on page loads)
+renderer = MarkdownRenderer(RENDER_CACHE_SIZE)
+
+def _cache_counts():
+    """Hits and misses of the render cache, and of the engine's caches once it is built"""
+    caches = {'render': renderer.cache}
+    if engine_registry.status()['ready']:
+        rag_engine = engine_registry.get()
+        caches.update(retrieval=rag_engine.retrieval_cache, answer=rag_engine.answer_cache)
+    counts = {}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        counts[(name, 'hit')] = stats['hits']
+        counts[(name, 'miss')] = stats['misses']
+    return counts
+
+def _index_stats():
+    if not engine_registry.status()['ready']:
+        return {}
+    rag_engine = engine_registry.get()
+    return {('documents',): len(rag_engine.documents), ('generation',): rag_engine.generation}
+
+metrics.registry.callback(
+    'botmit_cache_requests_total', "Cache lookups by cache and result", 'counter', ['cache', 'result'], _cache_counts
+)
+metrics.registry.callback(
+    'botmit_index', "Documents in the search index and its generation", 'gauge', ['stat'], _index_stats
+)
 
 # Admin authentication decorator
 def admin_required(f):
@@ -47,14 +93,52 @@ def admin_required(f):
     return decorated_function
 
 def process_markdown(text):
-    """Convert markdown to HTML and sanitize the output"""
-    # Convert markdown to HTML
-    html = markdown.markdown(text, extensions=['extra', 'nl2br'])
-    
-    # Sanitize HTML to prevent XSS attacks
-    sanitized_html = bleach.clean(html, tags=allowed_tags, attributes=allowed_attrs)
-    
-    return sanitized_html
+    """Convert markdown to HTML and sanitize the output, timing it for the request"""
+    with metrics.timed('render'):
+        return renderer.render(text)
+
+@chat_bp.before_request
+def start_trace():
+    metrics.start_trace(method=request.method)
+
+@chat_bp.after_request
+def finish_trace(response):
+    """Report this request's stage times in a Server-Timing header and record them.
+
+    A streamed response is still being produced at this point; it finishes its
+    own trace once the stream ends.
+    """
+    trace = metrics.current_trace()
+    if trace is None:
+        return response
+    if trace['stages']:
+        response.headers['Server-Timing'] = ", ".join(
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in trace['stages'].items()
+        )
+    if request.endpoint != 'chat_bp.chat_stream':
+        metrics.finish_trace(request.endpoint, status=response.status_code)
+    return response
+
+def _save_turn(session_id, sender, text):
+    with metrics.timed('session_save'):
+        conversations.append(session_id, turn(sender, text))
+
+def _session_id():
+    """The chat session ID of this browser tab, created on first use"""
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+    return session['session_id']
+
+def _page_messages(turns):
+    """Stored turns as the template shows them: the welcome first, bot markdown rendered to HTML"""
+    return [
+        {'sender': t['sender'], 'text': process_markdown(t['text']) if t['sender'] == 'bot' else t['text']}
+        for t in [turn('bot', WELCOME_MESSAGE)] + turns
+    ]
+
+def _save_session_now():
+    """Write the session from inside a streamed response, whose headers (and session) already went out"""
+    current_app.session_interface.save_session(current_app, session, current_app.response_class())
 
 @chat_bp.route('/', methods=['GET', 'POST'])
 def chat():
@@ -64,72 +148,44 @@ def chat():
     
     # If there's no referer or it doesn't match our domain, it's likely a new tab
     if not referer or current_url not in referer:
-        # Generate a new session ID for each new browser tab or window
+        # Generate a new session ID for each new browser tab or window;
+        # the previous conversation expires in the conversation store
         session['session_id'] = str(uuid.uuid4())
-        session['chat_history'] = []
-        # Add welcome message
-        session['chat_history'].append({
-            'sender': 'bot',
-            'text': process_markdown("# Welcome to BotMIT! 👋\nI'm your university assistant. How can I help you today?"),
-            'raw_text': "# Welcome to BotMIT! 👋\nI'm your university assistant. How can I help you today?"
-        })
-
-    # Generate a new session ID for each new browser tab or window
-    if request.method == 'GET' and 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())
-        session['chat_history'] = []
+        session.pop('chat_history', None)
     
-    # Initialize chat history in session if it doesn't exist
-    if 'chat_history' not in session:
-        session['chat_history'] = []
+    session_id = _session_id()
     
     if request.method == 'POST':
-        # Check if the request is JSON (from fetch) or form (from regular form submit)
-        if request.is_json:
-            user_input = request.json.get('user_input')
-        else:
-            user_input = request.form.get('user_input')
+        user_input = _user_input()
+        if user_input is None:
+            if request.is_json:
+                return jsonify({'bot_response': EMPTY_MESSAGE_ERROR}), 400
+            return redirect(url_for('chat_bp.chat'))
 
         try:
-            # Get current chat history from session
-            chat_history = session.get('chat_history', [])
-            
             # Add user message to history
-            chat_history.append({'sender': 'user', 'text': user_input})
+            _save_turn(session_id, 'user', user_input)
             
-            # Use RAG Engine with conversation history
-            bot_response = rag_engine.generate_response(
+            # Use RAG Engine with conversation history (ending with this question)
+            bot_response = engine_registry.get().generate_response(
                 user_input,
-                conversation_history=chat_history, 
-                system_prompt="You are BotMIT, a helpful University Assistant. Answer university-related questions based on the provided context. Format your responses with markdown for better readability. Use headers (# for main headings, ## for subheadings), bold (**text**) for emphasis, lists (* item) where appropriate, and other markdown formatting to make your responses clear and structured."
+                conversation_history=conversations.get(session_id),
+                system_prompt=CHAT_SYSTEM_PROMPT
             )
             
-            # Process markdown in the response (for displaying in the template)
-            processed_response = process_markdown(bot_response)
-            
-            # Add bot response to history (store both raw and processed versions)
-            chat_history.append({
-                'sender': 'bot', 
-                'text': processed_response,  # Store the HTML version
-                'raw_text': bot_response     # Store the raw markdown for follow-up context
-            })
-            
-            # Update session chat history
-            session['chat_history'] = chat_history
+            # Store the raw markdown; the page renders it to HTML when shown
+            _save_turn(session_id, 'bot', bot_response)
             
             # If it's a JSON request, return JSON response
             if request.is_json:
-                return jsonify({'bot_response': processed_response})
+                return jsonify({'bot_response': process_markdown(bot_response)})
                 
         except Exception as e:
             error_message = f"Error: {str(e)}"
             print(f"Error details: {e}")
             
-            # Update session with error
-            chat_history = session.get('chat_history', [])
-            chat_history.append({'sender': 'user', 'text': user_input})
-            chat_history.append({'sender': 'bot', 'text': error_message})
-            session['chat_history'] = chat_history
+            # Update history with error
+            _save_turn(session_id, 'bot', error_message)
             
             # If it's a JSON request, return JSON error
             if request.is_json:
@@ -139,19 +195,97 @@ def chat():
         if not request.is_json:
             return redirect(url_for('chat_bp.chat'))
 
-    return render_template('index.html', messages=session.get('chat_history', []))
+    return render_template('index.html', messages=_page_messages(conversations.get(session_id)))
+
+def _user_input():
+    """The chat message of a JSON (from fetch) or form request, or None if it is missing or blank"""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        user_input = data.get('user_input') if isinstance(data, dict) else None
+    else:
+        user_input = request.form.get('user_input')
+    if not isinstance(user_input, str) or not user_input.strip():
+        return None
+    return user_input
+
+def _sse(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the answer to a chat message as Server-Sent Events.
+
+    `token` events carry raw answer text as the LLM produces it; a final `done`
+    event carries the sanitized HTML and the time to first token and total time.
+    """
+    start = time.perf_counter()
+    user_input = _user_input()
+    if user_input is None:
+        return jsonify({'bot_response': EMPTY_MESSAGE_ERROR}), 400
+    
+    session_id = _session_id()
+    try:
+        _save_turn(session_id, 'user', user_input)
+        chat_history = conversations.get(session_id)
+    except Exception as e:
+        print(f"Error details: {e}")
+        return jsonify({'bot_response': f"Error: {str(e)}"}), 500
+    
+    def events():
+        first_token = None
+        parts = []
+        try:
+            for text in engine_registry.get().stream_response(
+                user_input,
+                conversation_history=chat_history,
+                system_prompt=CHAT_SYSTEM_PROMPT
+            ):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(text)
+                yield _sse('token', {'text': text})
+            
+            bot_response = "".join(parts)
+            _save_turn(session_id, 'bot', bot_response)
+            event = ('done', {'bot_response': process_markdown(bot_response)})
+        except Exception as e:
+            print(f"Error details: {e}")
+            _save_turn(session_id, 'bot', f"Error: {str(e)}")
+            event = ('error', {'bot_response': f"Error: {str(e)}"})
+        
+        total = time.perf_counter() - start
+        first_token = total if first_token is None else first_token
+        print(f"Streamed response: first token {first_token:.3f}s, total {total:.3f}s")
+        
+        # History kept in the session needs the session written again, now with the answer
+        if isinstance(conversations, SessionConversationStore):
+            with metrics.timed('session_save'):
+                _save_session_now()
+        
+        name, data = event
+        trace = metrics.finish_trace('chat_bp.chat_stream', status=200, event=name, ttft=round(first_token, 6))
+        data.update({'ttft': first_token, 'total': total, 'render': trace['stages'].get('render', 0.0) if trace else 0.0})
+        yield _sse(name, data)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @chat_bp.route('/clear', methods=['POST'])
 def clear_chat():
-    session['chat_history'] = []  # Clear chat history but keep session ID
+    conversations.clear(_session_id())  # Clear chat history but keep session ID
     return '', 204  # No Content (better for fetch)
 
 @chat_bp.route('/new-session', methods=['POST'])
 def new_session():
     """Create a brand new session - can be triggered by a button"""
+    if 'session_id' in session:
+        conversations.clear(session['session_id'])
     session.clear()  # Clear the entire session
     session['session_id'] = str(uuid.uuid4())
-    session['chat_history'] = []
     return '', 204  # No Content
 
 @chat_bp.route('/admin/login', methods=['GET', 'POST'])
@@ -183,8 +317,11 @@ def admin_logout():
 @admin_required
 def admin_dashboard():
     """Admin dashboard page"""
-    # Get list of all documents
-    documents = rag_engine.documents
+    rag_engine = engine_registry.get()
+    
+    # Get list of all documents, including edits made through other workers
+    rag_engine.refresh()
+    documents = list(rag_engine.documents.values())
     
     # Get list of all PDFs
     pdf_files = []
@@ -209,7 +346,7 @@ def add_document():
         source = request.form.get('source', 'university_data')
         
         if title and content:
-            doc_id = rag_engine.add_document(title, content, source)
+            doc_id = engine_registry.get().add_document(title, content, source)
             return render_template('admin_add_document.html', 
                                   message=f"Document added successfully with ID: {doc_id}")
         else:
@@ -238,12 +375,19 @@ def upload_pdf():
                                    
         if file and file.filename.endswith('.pdf'):
             try:
-                # Process and save the PDF
+                # Save the PDF and process it in the background
                 filename = secure_filename(file.filename)
-                saved_filename = rag_engine.upload_pdf(file, filename)
+                rag_engine = engine_registry.get()
+                saved_filename, upload_path = rag_engine.stage_upload(file, filename)
+                job = ingestion_jobs.submit(f"Ingest {saved_filename}", rag_engine.ingest_pdf, upload_path, saved_filename)
+                
+                # Scripted clients get the job ID to poll /admin/jobs/<id>
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({'job_id': job.id, 'status_url': url_for('chat_bp.job_status', job_id=job.id)}), 202
                 
                 return render_template('admin_upload_pdf.html', 
-                                       message=f"PDF file '{saved_filename}' uploaded and processed successfully")
+                                       message=f"PDF file '{saved_filename}' uploaded, processing in the background",
+                                       job=job.to_dict())
             except Exception as e:
                 return render_template('admin_upload_pdf.html', 
                                        error=f"Error processing PDF: {str(e)}")
@@ -259,7 +403,7 @@ def delete_document(doc_id):
     """Delete a text document from the knowledge base"""
     try:
         # Delete document using the RAG engine's method
-        success = rag_engine.delete_document(doc_id)
+        success = engine_registry.get().delete_document(doc_id)
         
         if success:
             return jsonify({'success': True, 'message': 'Document deleted successfully'})
@@ -280,7 +424,7 @@ def delete_pdf(filename):
         filename = secure_filename(filename)
         
         # Delete PDF using the RAG engine's method
-        success = rag_engine.delete_pdf(filename)
+        success = engine_registry.get().delete_pdf(filename)
         
         if success:
             return jsonify({'success': True, 'message': 'PDF deleted successfully'})
@@ -290,4 +434,41 @@ def delete_pdf(filename):
     except FileNotFoundError as e:
         return jsonify({'success': False, 'message': str(e)}), 404
     except Exception as e:
-        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@chat_bp.route('/admin/jobs/<job_id>')
+@admin_required
+def job_status(job_id):
+    """Report the progress of a background ingestion job"""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Job {job_id} not found'}), 404
+    return jsonify(job)
+
+@chat_bp.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    """Hit/miss counters of the in-process caches, for sizing them"""
+    rag_engine = engine_registry.get()
+    return jsonify({
+        'index_generation': rag_engine.generation,
+        'retrieval': rag_engine.retrieval_cache.stats(),
+        'answer': dict(rag_engine.answer_cache.stats(), seconds_saved=rag_engine.answer_seconds_saved),
+        'render': renderer.cache.stats(),
+    })
+
+@chat_bp.route('/health')
+def health():
+    """Liveness check: the worker is up, whether or not the engine is built"""
+    return jsonify({'status': 'ok'})
+
+@chat_bp.route('/metrics')
+def metrics_endpoint():
+    """Counters and latency histograms of this worker process, in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@chat_bp.route('/ready')
+def ready():
+    """Readiness check: 200 once the RAG engine is built, 503 while it warms up or if it failed"""
+    status = engine_registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
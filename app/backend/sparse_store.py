@@ -0,0 +1,390 @@
+# backend/sparse_store.py
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+from app.backend.retrieval import InvertedIndex
+from app.backend.retrievers import restore_retriever
+from app.backend.utils import write_npz
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): fine for the single-process development server
+    fcntl = None
+
+# Identifies files written by this store and the layout version inside them
+STORE_FORMAT = 'botmit-csr'
+STORE_VERSION = 5
+
+# Everything needed to serve searches without refitting: the rows of the last full
+# build (memory-mapped), the fitted retriever, the fingerprint of the documents the
+# index was built from, the document ID of each row and an InvertedIndex over the rows.
+# Rows appended or deleted since the last full build come from the delta segments:
+# `appended` holds the rows added since, `tombstones` marks deleted rows and
+# `oov_terms` holds the appended terms missing from the vocabulary.
+StoredIndex = namedtuple(
+    'StoredIndex',
+    ['embeddings', 'retriever', 'fingerprint', 'row_ids', 'tombstones', 'oov_terms', 'appended', 'postings'],
+    defaults=(None, frozenset(), None, None),
+)
+
+
+def content_hash(text):
+    """Hash of a single document's content"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def document_digest(doc_id, content_hash):
+    """One document's share of a fingerprint"""
+    return int.from_bytes(hashlib.sha256(f"{doc_id}:{content_hash}".encode('ascii')).digest(), 'big')
+
+
+def fingerprint(digests):
+    """Fingerprint of the documents an index was built from, given their digests.
+
+    A sum rather than a hash of the list, so adding or removing a document
+    updates it in constant time, whatever the document order.
+    """
+    return f"{sum(digests) % 2 ** 256:064x}"
+
+
+def _load_array(path):
+    """Memory-map a .npy file; empty arrays can't be mapped and are read normally"""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path)
+
+
+class SparseEmbeddingStore:
+    """Keeps the document embedding matrix as CSR rows on disk and in memory.
+
+    Each full build is written as a generation directory of raw .npy arrays
+    under `<path without .npz>.index/`, and a CURRENT file naming the live
+    generation is swapped in with an atomic rename. The arrays are loaded
+    memory-mapped, so every worker process on the machine serves searches from
+    the same page-cache copy. Workers that still have an older generation
+    mapped keep reading it safely after it is removed, and `signature()` tells
+    them when to reload. Writers hold `lock()`, so the workers' edits and full
+    builds take turns.
+
+    Edits between full builds are appended to `<generation>.delta/` as one
+    segment file each, named by the range of edits it holds, and merged into
+    one segment once there are more than `max_segments`.
+    """
+
+    def __init__(self, path, max_segments=32):
+        self.path = path
+        self.index_dir = os.path.splitext(path)[0] + '.index'
+        self.current_path = os.path.join(self.index_dir, 'CURRENT')
+        # Single delta file of older layouts, removed by the next full build
+        self.legacy_delta_path = os.path.splitext(path)[0] + '.delta.npz'
+        self.lock_path = os.path.splitext(path)[0] + '.lock'
+        self.max_segments = max_segments
+        self.generation = None
+
+    @contextmanager
+    def lock(self, blocking=True):
+        """Hold the index lock shared by all processes; yields False if non-blocking and another holds it"""
+        if fcntl is None:
+            yield True
+            return
+        with open(self.lock_path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def signature(self):
+        """Identity of the published index: the current generation and its delta segments.
+
+        Changes with every full build or delta save, by any process, since
+        generation and segment names are never reused.
+        """
+        try:
+            with open(self.current_path, 'r', encoding='utf-8') as f:
+                generation = f.read().strip()
+        except FileNotFoundError:
+            return None
+        try:
+            return generation, tuple(sorted(os.listdir(self._delta_dir(generation))))
+        except FileNotFoundError:
+            return generation, ()
+
+    def _delta_dir(self, generation):
+        return os.path.join(self.index_dir, generation + '.delta')
+
+    @staticmethod
+    def prepare(matrix):
+        """Convert any matrix to float32 CSR with sorted indices; the retriever has already weighted the rows"""
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        matrix.sort_indices()
+        return matrix
+
+    @staticmethod
+    def empty(n_features=0):
+        """Return an empty CSR matrix"""
+        return sparse.csr_matrix((0, n_features), dtype=np.float32)
+
+    def exists(self):
+        """Whether there is anything on disk to load, including legacy .npz files"""
+        return os.path.exists(self.current_path) or os.path.exists(self.path)
+
+    def save(self, matrix, retriever=None, content_fingerprint='', row_ids=None):
+        """Write a new generation and make it current; returns it loaded as a StoredIndex.
+
+        `row_ids` holds the document ID of each row (row i belongs to document i if None).
+        """
+        matrix = self.prepare(matrix)
+        if row_ids is None:
+            row_ids = np.arange(matrix.shape[0])
+        postings = InvertedIndex.build(matrix)
+        if retriever is not None:
+            terms, idf, params = retriever.state()
+        else:
+            terms, idf, params = np.array([], dtype=str), np.array([], dtype=np.float64), {}
+
+        # Term strings as one UTF-8 blob plus offsets, so they map like the other arrays
+        encoded = [term.encode('utf-8') for term in terms.tolist()]
+        term_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+
+        generation = f"gen-{uuid.uuid4().hex}"
+        tmp_dir = os.path.join(self.index_dir, generation + '.tmp')
+        os.makedirs(tmp_dir)
+        arrays = {
+            'data': matrix.data,
+            'indices': matrix.indices,
+            'indptr': matrix.indptr,
+            'postings_data': postings.postings.data,
+            'postings_indices': postings.postings.indices,
+            'postings_indptr': postings.postings.indptr,
+            'max_weight': postings.max_weight,
+            'idf': idf,
+            'term_offsets': term_offsets,
+            'row_ids': np.asarray(row_ids, dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        with open(os.path.join(tmp_dir, 'terms.bin'), 'wb') as f:
+            f.write(b''.join(encoded))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': STORE_FORMAT,
+                'version': STORE_VERSION,
+                'shape': list(matrix.shape),
+                'fingerprint': content_fingerprint,
+                'has_vectorizer': retriever is not None,
+                'retriever': retriever.name if retriever is not None else None,
+                'retriever_params': params,
+            }, f)
+
+        # Publish: the directory rename and the CURRENT swap are each atomic
+        os.rename(tmp_dir, os.path.join(self.index_dir, generation))
+        with open(self.current_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(generation)
+        os.replace(self.current_path + '.tmp', self.current_path)
+
+        # A full build absorbs every earlier incremental change, kept with the old generations
+        if os.path.exists(self.legacy_delta_path):
+            os.remove(self.legacy_delta_path)
+        self._remove_old_generations(generation)
+        return self._load_generation(generation)
+
+    def clear(self):
+        """Unpublish the index, e.g. when the last document was deleted"""
+        for path in (self.current_path, self.legacy_delta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(self.index_dir):
+            self._remove_old_generations(None)
+        self.generation = None
+
+    def _remove_old_generations(self, keep):
+        for name in os.listdir(self.index_dir):
+            # A generation's delta segments go with it
+            if name.startswith('gen-') and name not in (keep, f"{keep}.delta"):
+                try:
+                    shutil.rmtree(os.path.join(self.index_dir, name))
+                except OSError as e:
+                    print(f"Could not remove old index generation {name}: {e}")
+
+    def save_delta(self, appended, row_ids, tombstoned, oov_terms, content_fingerprint):
+        """Append one edit to the current generation as a new delta segment.
+
+        The segment holds only that edit's rows (with their document IDs), the
+        rows it tombstoned and the unseen terms it added, so the cost of a save
+        is proportional to the edit rather than to the corpus or earlier edits.
+        """
+        segments = self._segments(self.generation)
+        last = segments[-1][1] if segments else 0
+        self._write_segment(last + 1, last + 1, appended, row_ids, tombstoned, oov_terms, content_fingerprint)
+        if len(segments) + 1 > self.max_segments:
+            # Merge everything into one segment, then drop the ones it replaces
+            self._write_segment(1, last + 1, *self._read_delta(self.generation))
+            for _, _, path in segments:
+                os.remove(path)
+            os.remove(self._segment_path(last + 1, last + 1))
+
+    def _segment_path(self, first, last):
+        return os.path.join(self._delta_dir(self.generation), f"{first:08d}-{last:08d}.npz")
+
+    def _write_segment(self, first, last, appended, row_ids, tombstoned, oov_terms, content_fingerprint):
+        appended = sparse.csr_matrix(appended, dtype=np.float32)
+        os.makedirs(self._delta_dir(self.generation), exist_ok=True)
+        self._write(
+            self._segment_path(first, last),
+            format=np.array(STORE_FORMAT),
+            version=np.array(STORE_VERSION),
+            shape=np.array(appended.shape, dtype=np.int64),
+            data=appended.data,
+            indices=appended.indices,
+            indptr=appended.indptr,
+            row_ids=np.asarray(row_ids, dtype=np.int64),
+            tombstones=np.asarray(tombstoned, dtype=np.int64),
+            oov_terms=np.array(sorted(oov_terms), dtype=str),
+            fingerprint=np.array(content_fingerprint),
+        )
+
+    def _write(self, path, **arrays):
+        # The temporary file goes next to the delta directories, so listing one never shows a partial segment
+        write_npz(path, self.index_dir, **arrays)
+
+    def _segments(self, generation):
+        """(first edit, last edit, path) of each delta segment, in the order to apply them.
+
+        A merged segment sorts before the segments it replaced, in case a merge
+        was interrupted before removing them, and they are then skipped.
+        """
+        try:
+            names = os.listdir(self._delta_dir(generation))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            first, _, last = os.path.splitext(name)[0].partition('-')
+            if name.endswith('.npz') and first.isdigit() and last.isdigit():
+                segments.append((int(first), int(last), os.path.join(self._delta_dir(generation), name)))
+        return sorted(segments, key=lambda segment: (segment[0], -segment[1]))
+
+    def _read_delta(self, generation):
+        """All edits since a generation's full build, combined:
+        (appended rows, their document IDs, tombstoned rows, unseen terms, fingerprint), or None
+        """
+        parts = []
+        applied = 0
+        for first, last, path in self._segments(generation):
+            if last <= applied:
+                continue
+            with np.load(path) as segment:
+                if str(segment['format']) != STORE_FORMAT or int(segment['version']) != STORE_VERSION:
+                    print(f"Delta segment {path} has an unsupported format, ignoring it")
+                    continue
+                shape = tuple(int(n) for n in segment['shape'])
+                parts.append((
+                    sparse.csr_matrix((segment['data'], segment['indices'], segment['indptr']), shape=shape),
+                    segment['row_ids'],
+                    segment['tombstones'],
+                    segment['oov_terms'].tolist(),
+                    str(segment['fingerprint']),
+                ))
+            applied = last
+        if not parts:
+            return None
+        appended, row_ids, tombstoned, oov_terms, fingerprints = zip(*parts)
+        return (
+            sparse.vstack(appended, format='csr'),
+            np.concatenate(row_ids),
+            np.unique(np.concatenate(tombstoned)),
+            set().union(*oov_terms),
+            fingerprints[-1],
+        )
+
+    def load(self):
+        """Load the current generation memory-mapped, plus any incremental changes.
+
+        Returns a StoredIndex, or None when there is nothing usable on disk.
+        Files from older layouts (a single .npz) return None, so the caller
+        refits once and writes the current layout.
+        """
+        if not os.path.exists(self.current_path):
+            if os.path.exists(self.path):
+                print(f"Embedding file {self.path} uses an older layout, ignoring it")
+            return None
+
+        with open(self.current_path, 'r', encoding='utf-8') as f:
+            generation = f.read().strip()
+        stored = self._load_generation(generation)
+        if stored is not None and stored.retriever is not None:
+            stored = self._apply_delta(stored)
+        return stored
+
+    def _load_generation(self, generation):
+        directory = os.path.join(self.index_dir, generation)
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Generations before version 5 don't record the document of each row
+        if meta.get('format') != STORE_FORMAT or meta.get('version', 0) != STORE_VERSION:
+            print(f"Index generation {generation} has an unsupported format, ignoring it")
+            return None
+
+        arrays = {
+            name: _load_array(os.path.join(directory, f"{name}.npy"))
+            for name in ('data', 'indices', 'indptr', 'postings_data', 'postings_indices',
+                         'postings_indptr', 'max_weight', 'idf', 'term_offsets', 'row_ids')
+        }
+        shape = tuple(meta['shape'])
+        # copy=False keeps the matrices backed by the mapped files
+        embeddings = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False
+        )
+        postings = InvertedIndex(
+            sparse.csr_matrix(
+                (arrays['postings_data'], arrays['postings_indices'], arrays['postings_indptr']),
+                shape=(shape[1], shape[0]), copy=False,
+            ),
+            arrays['max_weight'],
+        )
+
+        retriever = None
+        if meta.get('has_vectorizer'):
+            with open(os.path.join(directory, 'terms.bin'), 'rb') as f:
+                blob = f.read()
+            offsets = arrays['term_offsets']
+            terms = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+            # Generations written before there was a choice of retriever are TF-IDF
+            retriever = restore_retriever(
+                meta.get('retriever') or 'tfidf', terms, np.asarray(arrays['idf']), meta.get('retriever_params', {})
+            )
+
+        self.generation = generation
+        return StoredIndex(embeddings, retriever, meta['fingerprint'], arrays['row_ids'], postings=postings)
+
+    def _apply_delta(self, stored):
+        """Attach the rows, tombstones and unseen terms recorded since the last full build"""
+        delta = self._read_delta(self.generation)
+        if delta is None:
+            return stored
+
+        appended, row_ids, tombstoned, oov_terms, content_fingerprint = delta
+        tombstones = np.zeros(stored.embeddings.shape[0] + appended.shape[0], dtype=bool)
+        tombstones[tombstoned] = True
+        return stored._replace(
+            row_ids=np.concatenate([stored.row_ids, row_ids]),
+            appended=appended,
+            postings=stored.postings.extend(appended),
+            fingerprint=content_fingerprint,
+            tombstones=tombstones,
+            oov_terms=frozenset(oov_terms),
+        )
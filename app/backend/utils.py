@@ -1,6 +1,51 @@
 # backend/utils.py
 import os
 import json
+import uuid
+import sqlite3
+import threading
+import numpy as np
+
+# Seconds a SQLite connection waits on another connection's write lock before raising 'database is locked'
+SQLITE_BUSY_TIMEOUT = 10
+
+
+def write_npz(path, tmp_dir=None, **arrays):
+    """Write an .npz file and move it into place in one step so readers never see a partial write.
+
+    The temporary file is named tmp-<uuid>.npz, in `tmp_dir` or next to `path`,
+    so it never matches the name patterns stores list their files by.
+    """
+    tmp_path = os.path.join(tmp_dir or os.path.dirname(path), f"tmp-{uuid.uuid4().hex}.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+class SQLiteConnections:
+    """Per-thread SQLite connections in WAL mode, shared by the SQLite-backed stores.
+
+    sqlite3 connections can't be shared between threads, or across a fork, so each
+    thread lazily opens its own and a forked child drops the ones it inherited.
+    """
+
+    def __init__(self, path, timeout=SQLITE_BUSY_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def get(self):
+        if os.getpid() != self._pid:
+            # Forked (e.g. a gunicorn worker of a preloading master): drop the parent's connections
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
 
 def load_sample_data():
     """Load sample university data on startup if none exists"""
@@ -91,6 +91,17 @@ form.addEventListener("submit", async function (e) {
   startTypingAnimation();
   typingIndicator.scrollIntoView({ behavior: "smooth" });
 
+  // Stream the answer when the browser supports it
+  try {
+    if (await streamMessage(userMessage)) return;
+  } catch (error) {
+    console.error(error);
+    stopTypingAnimation();
+    typingIndicator.classList.add("hidden");
+    addMessage("Error: Could not connect to server", "bot");
+    return;
+  }
+
   // Send request to server
   try {
     const response = await fetch(chatEndpoint, {
@@ -118,6 +129,84 @@ form.addEventListener("submit", async function (e) {
   }
 });
 
+// Stream a reply over Server-Sent Events, showing text as it arrives.
+// Returns false (before anything is sent) when streaming isn't available.
+async function streamMessage(userMessage) {
+  if (typeof chatStreamEndpoint === "undefined" || !window.ReadableStream || !window.TextDecoder) {
+    return false;
+  }
+
+  const start = performance.now();
+  const response = await fetch(chatStreamEndpoint, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "Accept": "text/event-stream",
+    },
+    body: JSON.stringify({ user_input: userMessage }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let answer = "";
+  let bubble = null;
+  let firstTokenMs = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let eventName = "message";
+      let data = "";
+      frame.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) eventName = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      const payload = JSON.parse(data);
+
+      if (!bubble) {
+        stopTypingAnimation();
+        typingIndicator.classList.add("hidden");
+        bubble = addMessage("", "bot");
+      }
+
+      if (eventName === "token") {
+        if (firstTokenMs === null) firstTokenMs = performance.now() - start;
+        // Plain text while streaming; the sanitized HTML replaces it at the end
+        answer += payload.text;
+        bubble.textContent = answer;
+        bubble.scrollIntoView({ behavior: "smooth", block: "end" });
+      } else if (eventName === "done" || eventName === "error") {
+        bubble.innerHTML = markdownToHtml(payload.bot_response);
+        bubble.scrollIntoView({ behavior: "smooth", block: "end" });
+        console.debug(
+          `BotMIT reply: first token ${Math.round(firstTokenMs ?? performance.now() - start)}ms, ` +
+          `total ${Math.round(performance.now() - start)}ms ` +
+          `(server: ${Math.round(payload.ttft * 1000)}ms / ${Math.round(payload.total * 1000)}ms)`
+        );
+      }
+    }
+  }
+
+  if (!bubble) {
+    stopTypingAnimation();
+    typingIndicator.classList.add("hidden");
+    addMessage("Error: No response from server", "bot");
+  }
+  return true;
+}
+
 function startTypingAnimation() {
   let dots = "";
   typingInterval = setInterval(() => {
@@ -153,6 +242,8 @@ function addMessage(text, sender) {
 
   // Scroll to bottom smoothly
   messageDiv.scrollIntoView({ behavior: "smooth" });
+
+  return innerDiv;
 }
 
 // Add event listener for new session button
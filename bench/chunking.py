@@ -0,0 +1,102 @@
+# bench/chunking.py
+"""Compare the fixed word-window chunker with the structure-aware one on the bundled PDFs.
+
+For each chunker: chunk count, words stored relative to the source text,
+TF-IDF index size, and retrieval quality on labeled questions (whether the
+answer passage is in the top 1/3/5 chunks) together with the words the top 3
+chunks would add to a prompt. Run from the repository root:
+
+    python bench/chunking.py [--questions bench/pdf_questions.jsonl] [--sizes 120 200 300]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.ingestion import PDFTextExtractor  # noqa: E402
+from app.backend.chunking import structured_chunks, word_chunks  # noqa: E402
+from app.backend.retrieval import InvertedIndex  # noqa: E402
+
+TOP_K = 5
+THRESHOLD = 0.1
+
+
+def squash(text):
+    """Lowercased letters and digits only, so PDF spacing quirks ("i n", "MIT -WPU") don't matter"""
+    return re.sub(r"\W+", "", text.lower())
+
+
+def load_questions(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def measure(name, chunks, questions, source_words):
+    texts = [chunk['text'] for chunk in chunks]
+    start = time.perf_counter()
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform(texts).astype('float32')
+    index = InvertedIndex.build(matrix)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = index.search_batch(vectorizer.transform([q['query'] for q in questions]), TOP_K, THRESHOLD)
+    query_ms = (time.perf_counter() - start) * 1000 / len(questions)
+
+    squashed = [squash(text) for text in texts]
+    hits = {1: 0, 3: 0, 5: 0}
+    context_words = 0
+    for question, (rows, _) in zip(questions, results):
+        answer = squash(question['answer'])
+        found = [i for i, row in enumerate(rows) if answer in squashed[row]]
+        for k in hits:
+            hits[k] += bool(found) and found[0] < k
+        context_words += sum(len(texts[row].split()) for row in rows[:3])
+
+    stored_words = sum(len(text.split()) for text in texts)
+    index_kb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1024
+    n = len(questions)
+    print(f"{name:<22}{len(chunks):>7}{stored_words / source_words:>8.2f}x{matrix.nnz:>9}{index_kb:>9.0f}"
+          f"{hits[1] / n:>7.0%}{hits[3] / n:>7.0%}{hits[5] / n:>7.0%}{context_words / n:>10.0f}"
+          f"{build_ms:>9.1f}{query_ms:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdfs', default=os.path.join('data', 'pdfs'))
+    parser.add_argument('--questions', default=os.path.join('bench', 'pdf_questions.jsonl'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[120, 200, 300],
+                        help="max words per structured chunk (min is a fifth of it)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        extractor = PDFTextExtractor(cache_dir)
+        documents = [extractor.extract_pages(path) for path in sorted(glob.glob(os.path.join(args.pdfs, '*.pdf')))]
+    questions = load_questions(args.questions)
+    source_words = sum(len(page.split()) for pages in documents for page in pages)
+
+    source = squash(" ".join(page for pages in documents for page in pages))
+    missing = [q['query'] for q in questions if squash(q['answer']) not in source]
+    if missing:
+        print(f"Warning: {len(missing)} answers don't occur in the PDFs: {missing}")
+
+    print(f"{len(documents)} PDFs, {source_words} words, {len(questions)} labeled questions\n")
+    print(f"{'chunker':<22}{'chunks':>7}{'stored':>9}{'nnz':>9}{'index KB':>9}"
+          f"{'hit@1':>7}{'hit@3':>7}{'hit@5':>7}{'ctx words':>10}{'build ms':>9}{'query ms':>9}")
+    measure("words 1000/200", [chunk for pages in documents for chunk in word_chunks(pages)],
+            questions, source_words)
+    for size in args.sizes:
+        chunks = [chunk for pages in documents for chunk in structured_chunks(pages, size, size // 5)]
+        measure(f"structured {size}/{size // 5}", chunks, questions, source_words)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# bench/concurrency.py
+"""Stress RAGEngine with concurrent searches while documents are added, deleted and the index refit.
+
+Runs on a scratch copy of data/ and embeddings_db/. Reader threads search
+queries from a JSONL query log against the engine's current snapshot and check
+that every hit belongs to that snapshot's documents; a writer thread adds and
+deletes documents and every few edits forces a full refit, which changes the
+vocabulary and matrix shape under the readers. Reports search latency with and
+without the writer, the edits made and any errors or inconsistent hits (the
+run fails if there are any). Run from the repository root:
+
+    python bench/concurrency.py [--readers 8] [--duration 10] [--refit-every 10]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.backend.rag_engine import RAGEngine  # noqa: E402
+
+
+def load_queries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['query'] for line in f if line.strip()]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = []
+        self.inconsistent = 0
+
+    def error(self, where):
+        with self.lock:
+            if len(self.errors) < 5:
+                self.errors.append(f"{where}: {traceback.format_exc()}")
+            else:
+                self.errors.append(where)
+
+
+def reader(engine, queries, stop, stats, seed):
+    rng = random.Random(seed)
+    latencies = []
+    while not stop.is_set():
+        query = rng.choice(queries)
+        start = time.perf_counter()
+        try:
+            # Bypass the retrieval cache so every call searches the index
+            snapshot = engine.snapshot
+            results = engine._search_uncached(snapshot, [query], 5)[0]
+        except Exception:
+            stats.error('search')
+            continue
+        latencies.append(time.perf_counter() - start)
+        stale = sum(result['document']['id'] not in snapshot.documents for result in results)
+        if stale:
+            with stats.lock:
+                stats.inconsistent += stale
+    with stats.lock:
+        stats.latencies.extend(latencies)
+
+
+def writer(engine, texts, stop, stats, refit_every, edits):
+    rng = random.Random(1)
+    added = []
+    while not stop.is_set():
+        try:
+            # Mix in unseen terms so the appended rows drift from the fitted vocabulary
+            text = f"{rng.choice(texts)} stressterm{rng.randrange(10 ** 6)}"
+            added.append(engine.add_document(f"Stress {len(added)}", text, 'stress_test'))
+            edits['add'] += 1
+            if len(added) > 20:
+                engine.delete_document(added.pop(rng.randrange(len(added))))
+                edits['delete'] += 1
+            if (edits['add'] + edits['delete']) % refit_every == 0:
+                engine._compact()
+                edits['refit'] += 1
+        except Exception:
+            stats.error('write')
+
+
+def run(engine, queries, texts, readers, duration, refit_every, with_writer):
+    stats = Stats()
+    edits = {'add': 0, 'delete': 0, 'refit': 0}
+    stop = threading.Event()
+    threads = [threading.Thread(target=reader, args=(engine, queries, stop, stats, i)) for i in range(readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(engine, texts, stop, stats, refit_every, edits)))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = np.array(stats.latencies) * 1000
+    p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+    name = "search + writes" if with_writer else "search only"
+    print(f"{name:<18}{len(latencies) / duration:>10.0f}{p50:>9.2f}{p99:>9.2f}"
+          f"{edits['add']:>7}{edits['delete']:>8}{edits['refit']:>7}{len(stats.errors):>8}{stats.inconsistent:>14}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', default=os.path.join(ROOT, 'bench', 'queries.jsonl'))
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per run")
+    parser.add_argument('--refit-every', type=int, default=10, help="force a full refit every N edits")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('data', 'embeddings_db'):
+            shutil.copytree(os.path.join(ROOT, name), os.path.join(tmp, name))
+        engine = RAGEngine(os.path.join(tmp, 'data'), os.path.join(tmp, 'embeddings_db', 'embeddings.npz'))
+        texts = [document['content'] for document in engine.document_store.get_many(list(engine.documents)).values()]
+
+        print(f"{len(engine.documents)} documents, {len(queries)} queries, {args.readers} reader threads\n")
+        print(f"{'run':<18}{'search/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'adds':>7}{'deletes':>8}{'refits':>7}"
+              f"{'errors':>8}{'inconsistent':>14}")
+        run(engine, queries, texts, args.readers, args.duration, args.refit_every, with_writer=False)
+        stats = run(engine, queries, texts, args.readers, args.duration, args.refit_every, with_writer=True)
+        if engine._compaction_thread is not None:
+            engine._compaction_thread.join()
+
+    for error in stats.errors[:5]:
+        print(f"\n{error}")
+    if stats.errors or stats.inconsistent:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# bench/dense.py
+"""Measure the dense retrieval backend: answer quality alone and fused with the lexical index, and IVF speed and recall.
+
+Quality: the labeled questions (bench/pdf_questions.jsonl) and the same
+questions reworded without their key terms (bench/paraphrase_questions.jsonl)
+are searched against the bundled knowledge base and the structure-aware PDF
+chunks, with each lexical retriever alone, the dense encoder alone and the two
+merged by reciprocal rank fusion, as RAGEngine does with DENSE_ENCODER set.
+Reports hit@k, MRR, questions without hits and how many off-topic questions
+get hits, for each --thresholds value of the dense cosine threshold.
+
+Speed: over synthetic corpora of university-like chunks, the encoder fit and
+encode time, start-up from the embedding cache, and per-query search time of
+exact search and of the IVF index at several --nprobe values, with the IVF
+recall@5 against exact search. Run from the repository root:
+
+    python bench/dense.py [--sizes 10000 50000] [--thresholds 0.3 0.5] [--nprobe 8 16 32]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.ingestion import PDFTextExtractor  # noqa: E402
+from app.backend.chunking import structured_chunks  # noqa: E402
+from app.backend.dense_index import DenseIndex  # noqa: E402
+from app.backend.retrieval import InvertedIndex, IVFIndex, reciprocal_rank_fusion  # noqa: E402
+from app.backend.retrievers import BM25Retriever, TfidfRetriever  # noqa: E402
+from app.backend.sparse_store import SparseEmbeddingStore, content_hash  # noqa: E402
+from chunking import load_questions, squash  # noqa: E402
+from e2e import synthetic_corpus  # noqa: E402
+from retrievers import OFF_TOPIC  # noqa: E402
+
+TOP_K = 5
+
+
+def lexical_search(retriever, texts):
+    index = InvertedIndex.build(SparseEmbeddingStore.prepare(retriever.fit_transform(texts)))
+    return lambda queries: index.search_batch(retriever.transform_queries(queries), TOP_K, retriever.threshold)
+
+
+def score(results, questions, squashed):
+    """hit@1/3/5, MRR and unanswered count of one result list per question"""
+    hits = {1: 0, 3: 0, 5: 0}
+    reciprocal_rank = 0.0
+    unanswered = 0
+    for question, (rows, _) in zip(questions, results):
+        answer = squash(question['answer'])
+        found = [i for i, row in enumerate(rows) if answer in squashed[row]]
+        for k in hits:
+            hits[k] += bool(found) and found[0] < k
+        reciprocal_rank += 1 / (found[0] + 1) if found else 0.0
+        unanswered += len(rows) == 0
+    n = len(questions)
+    return f"{hits[1] / n:>7.0%}{hits[3] / n:>7.0%}{hits[5] / n:>7.0%}{reciprocal_rank / n:>7.2f}{unanswered:>9}"
+
+
+def quality(name, texts, question_sets, thresholds):
+    squashed = [squash(text) for text in texts]
+    with tempfile.TemporaryDirectory() as tmp:
+        dense = DenseIndex(tmp, 'lsa', threshold=thresholds[0])
+        dense.fit(texts)
+        searches = {'tfidf': lexical_search(TfidfRetriever(), texts), 'bm25': lexical_search(BM25Retriever(), texts)}
+
+        print(f"\nQuality on {name}: {len(texts)} chunks, {dense.state.encoder.vector_size} LSA dimensions")
+        print(f"  {'questions':<12}{'backend':<24}{'hit@1':>7}{'hit@3':>7}{'hit@5':>7}{'MRR':>7}{'no hits':>9}"
+              f"{'off-topic hits':>15}")
+        for set_name, questions in question_sets:
+            queries = [q['query'] for q in questions]
+            rows = []
+            for label, search in searches.items():
+                rows.append((label, search(queries), search(OFF_TOPIC)))
+            for threshold in thresholds:
+                dense.threshold = threshold
+                dense_results, dense_off = dense.search_batch(queries, TOP_K), dense.search_batch(OFF_TOPIC, TOP_K)
+                rows.append((f"lsa >{threshold:g}", dense_results, dense_off))
+                for label, search in searches.items():
+                    fused = [reciprocal_rank_fusion(pair, TOP_K) for pair in zip(search(queries), dense_results)]
+                    fused_off = [reciprocal_rank_fusion(pair, TOP_K) for pair in zip(search(OFF_TOPIC), dense_off)]
+                    rows.append((f"{label} + lsa >{threshold:g}", fused, fused_off))
+            for label, results, off_topic in rows:
+                off_hits = sum(len(hits) > 0 for hits, _ in off_topic)
+                print(f"  {set_name:<12}{label:<24}{score(results, questions, squashed)}{off_hits:>8}/{len(OFF_TOPIC)}")
+
+
+def speed(n_docs, queries, nprobes, repeat, ivf_min_rows):
+    texts = [doc['content'] for doc in synthetic_corpus(n_docs)]
+    with tempfile.TemporaryDirectory() as tmp:
+        dense = DenseIndex(tmp, 'lsa', threshold=0.0, ivf_min_rows=ivf_min_rows)
+        start = time.perf_counter()
+        dense.fit(texts)
+        build_s = time.perf_counter() - start
+        encoder = dense.state.encoder
+
+        start = time.perf_counter()
+        encoder.encode(texts, dense.batch_size)
+        encode_s = time.perf_counter() - start
+
+        # Start-up: a fresh index over the same directory, every vector served by the cache
+        start = time.perf_counter()
+        restored = DenseIndex(tmp, 'lsa', threshold=0.0, ivf_min_rows=ivf_min_rows)
+        restored.restore([content_hash(text) for text in texts], lambda rows: [texts[row] for row in rows])
+        restore_s = time.perf_counter() - start
+
+    ivf = dense.state.ivf
+    lists = len(ivf.centroids) if ivf.centroids is not None else 0
+    print(f"\n{n_docs} synthetic chunks: fit + encode + cluster {build_s:.2f}s ({lists} IVF lists), "
+          f"encode alone {encode_s:.2f}s, start-up from the cache {restore_s:.2f}s")
+    print(f"  {'search':<16}{'ms/query':>10}{'batched':>10}{'recall@5':>10}")
+
+    query_matrix = encoder.encode(queries, dense.batch_size)
+    exact = IVFIndex(ivf.vectors, ivf.list_rows, ivf.list_offsets)
+    configurations = [('exact', exact, 0)] + [(f"ivf nprobe={n}", ivf, n) for n in nprobes if lists]
+    truth = None
+    for label, index, nprobe in configurations:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for row in query_matrix:
+                index.search_batch(row[None, :], TOP_K, 0.0, nprobe=nprobe)
+        single_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = index.search_batch(query_matrix, TOP_K, 0.0, nprobe=nprobe)
+        batch_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(rows) & set(best)) / max(len(best), 1) for (rows, _), (best, _) in zip(results, truth)])
+        print(f"  {label:<16}{single_ms:>10.3f}{batch_ms:>10.3f}{recall:>10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', default=os.path.join('bench', 'pdf_questions.jsonl'))
+    parser.add_argument('--paraphrases', default=os.path.join('bench', 'paraphrase_questions.jsonl'))
+    parser.add_argument('--queries', default=os.path.join('bench', 'queries.jsonl'))
+    parser.add_argument('--pdfs', default=os.path.join('data', 'pdfs'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000], help="synthetic corpus sizes")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.3, 0.5], help="dense cosine thresholds")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32], help="IVF lists scanned per query")
+    parser.add_argument('--ivf-min-rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    question_sets = [('labeled', load_questions(args.questions)), ('reworded', load_questions(args.paraphrases))]
+    with open(os.path.join('data', 'university_data.json'), encoding='utf-8') as f:
+        stored = [doc['content'] for doc in json.load(f)['documents']]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        extractor = PDFTextExtractor(cache_dir)
+        structured = [
+            chunk['text']
+            for path in sorted(glob.glob(os.path.join(args.pdfs, '*.pdf')))
+            for chunk in structured_chunks(extractor.extract_pages(path))
+        ]
+    for name, texts in [("stored documents", stored), ("structured chunks", structured)]:
+        quality(name, texts, question_sets, args.thresholds)
+
+    queries = [json.loads(line)['query'] for line in open(args.queries, encoding='utf-8') if line.strip()]
+    for n_docs in args.sizes:
+        speed(n_docs, queries, args.nprobe, args.repeat, args.ivf_min_rows)
+
+
+if __name__ == '__main__':
+    main()
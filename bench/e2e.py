@@ -0,0 +1,300 @@
+# bench/e2e.py
+"""End-to-end benchmark of RAGEngine on synthetic university corpora, with results saved as JSON.
+
+For each corpus size a synthetic knowledge base is generated from recombined
+sentences of the bundled documents (each document a heading plus about 200
+words, like a PDF chunk, with its own course codes and names so the vocabulary
+grows with the corpus). Then, each in a fresh process so peak RSS and start-up
+are measured on their own:
+
+  build  RAGEngine() over the new corpus: import into the document store and fit the index
+  serve  RAGEngine() again, loading the persisted index (the start-up time), then replay the
+         query log through search (retrieval cache off) and generate_response (stub LLM,
+         answer cache off), sequentially for latency and from --threads threads for throughput
+
+Results (latency p50/p95/p99, throughput, peak RSS, build and start-up time)
+are written to --output together with the commit they were measured at; pass
+an earlier results file as --compare to print the change per metric. Run from
+the repository root:
+
+    python bench/e2e.py [--sizes 1000 10000] [--queries bench/queries.jsonl] [--compare old.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+DEPARTMENTS = [
+    'Computer Science', 'Electronics', 'Mechanical Engineering', 'Civil Engineering', 'Chemical Engineering',
+    'Management', 'Law', 'Design', 'Pharmacy', 'Liberal Arts', 'Commerce', 'Biosciences',
+]
+TOPICS = [
+    'Admission Policy', 'Fee Structure', 'Examination Rules', 'Hostel Rules', 'Scholarships', 'Attendance',
+    'Course Registration', 'Placements', 'Library', 'Academic Calendar', 'Grievance Redressal', 'Refund Policy',
+]
+
+# Replayed on top of the query log: the engine, not the caches, is being measured
+ENGINE_ENV = {
+    'LLM_BACKEND': 'stub',
+    'RETRIEVAL_CACHE_SIZE': '0',
+    'ANSWER_CACHE_SIZE': '0',
+    'TRACE_LOG': '',
+    'PYTHONWARNINGS': 'ignore',
+}
+
+# Metrics shown by --compare, as (path in a size's result, lower is better)
+COMPARED = [
+    ('build_s', True), ('build_peak_rss_mb', True), ('startup_s', True), ('serve_peak_rss_mb', True),
+    ('search.p50_ms', True), ('search.p95_ms', True), ('search.p99_ms', True), ('search.throughput_qps', False),
+    ('generate.p50_ms', True), ('generate.p95_ms', True), ('generate.p99_ms', True),
+    ('generate.throughput_qps', False),
+]
+
+
+def load_queries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['query'] for line in f if line.strip()]
+
+
+def synthetic_corpus(n_docs, words_per_doc=200, seed=0):
+    """University-like documents: a department/topic heading and sentences sampled from the bundled corpus"""
+    from app.backend.context import split_sentences
+
+    with open(os.path.join(ROOT, 'data', 'university_data.json'), encoding='utf-8') as f:
+        bundled = [doc['content'] for doc in json.load(f)['documents']]
+    sentences = [s for text in bundled for s in split_sentences(text) if 5 <= len(s.split()) <= 60]
+
+    rng = random.Random(seed)
+    documents = []
+    for i in range(n_docs):
+        department, topic = rng.choice(DEPARTMENTS), rng.choice(TOPICS)
+        # A few identifiers unique to the document, as real course and notice codes are
+        words = [f"{department} {topic}: course {department[:3].upper()}{i} notice {rng.randrange(10 ** 6)}."]
+        count = len(words[0].split())
+        while count < words_per_doc:
+            sentence = rng.choice(sentences)
+            words.append(sentence)
+            count += len(sentence.split())
+        documents.append({
+            'id': i,
+            'title': f"{department} - {topic} {i}",
+            'content': " ".join(words),
+            'source': 'synthetic',
+        })
+    return documents
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_stats(seconds):
+    ms = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'mean_ms': float(ms.mean()), 'calls': len(ms)}
+
+
+def replay(call, queries, repeat, threads):
+    """Per-call latencies over `repeat` sequential passes, then throughput from `threads` threads"""
+    for query in queries[:5]:
+        call(query)  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            call(query)
+            latencies.append(time.perf_counter() - start)
+    stats = latency_stats(latencies)
+
+    work = [query for _ in range(repeat) for query in queries]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not work:
+                    return
+                query = work.pop()
+            call(query)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    stats['throughput_qps'] = repeat * len(queries) / (time.perf_counter() - start)
+    stats['threads'] = threads
+    return stats
+
+
+def run_phase(args):
+    """Child process: build or serve the engine in args.dir and write the measurements to args.result"""
+    start = time.perf_counter()
+    from app.backend.rag_engine import RAGEngine
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = RAGEngine(os.path.join(args.dir, 'data'), os.path.join(args.dir, 'embeddings_db', 'embeddings.npz'))
+    engine_s = time.perf_counter() - start
+
+    if args.phase == 'build':
+        result = {'build_s': engine_s, 'build_peak_rss_mb': peak_rss_mb(), 'documents': len(engine.documents),
+                  'terms': len(engine.retriever.vocabulary_)}
+    else:
+        queries = load_queries(args.queries)
+        result = {
+            'import_s': import_s,
+            'startup_s': engine_s,
+            'search': replay(engine.search, queries, args.repeat, args.threads),
+            'generate': replay(engine.generate_response, queries, args.repeat, args.threads),
+            'serve_peak_rss_mb': peak_rss_mb(),
+        }
+    with open(args.result, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_child(phase, tmp, args):
+    result_path = os.path.join(tmp, f'{phase}.json')
+    command = [
+        sys.executable, os.path.abspath(__file__), '--phase', phase, '--dir', tmp, '--result', result_path,
+        '--queries', os.path.abspath(args.queries), '--repeat', str(args.repeat), '--threads', str(args.threads),
+    ]
+    env = dict(os.environ, **ENGINE_ENV, LLM_STUB_LATENCY=str(args.stub_latency))
+    subprocess.run(command, cwd=tmp, env=env, check=True,
+                   stdout=None if args.verbose else subprocess.DEVNULL)
+    with open(result_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def measure(n_docs, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'data'))
+        with open(os.path.join(tmp, 'data', 'university_data.json'), 'w', encoding='utf-8') as f:
+            json.dump({'documents': synthetic_corpus(n_docs)}, f)
+        result = {'size': n_docs}
+        result.update(run_child('build', tmp, args))
+        result.update(run_child('serve', tmp, args))
+    return result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def lookup(result, path):
+    for key in path.split('.'):
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def print_results(results):
+    print(f"{'docs':>8}{'build s':>9}{'build MB':>10}{'start s':>9}{'serve MB':>10}"
+          f"{'search p50/p95/p99 ms':>25}{'q/s':>8}{'generate p50/p95/p99 ms':>27}{'q/s':>8}")
+    for r in results:
+        s, g = r['search'], r['generate']
+        print(f"{r['size']:>8}{r['build_s']:>9.2f}{r['build_peak_rss_mb']:>10.0f}{r['startup_s']:>9.2f}"
+              f"{r['serve_peak_rss_mb']:>10.0f}"
+              f"{s['p50_ms']:>11.2f}/{s['p95_ms']:.2f}/{s['p99_ms']:.2f}{s['throughput_qps']:>8.0f}"
+              f"{g['p50_ms']:>13.2f}/{g['p95_ms']:.2f}/{g['p99_ms']:.2f}{g['throughput_qps']:>8.0f}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}); "
+          f"'!' marks a change for the worse of more than 10%")
+    old_by_size = {r['size']: r for r in baseline['results']}
+    for r in results:
+        old = old_by_size.get(r['size'])
+        if old is None:
+            continue
+        print(f"\n{r['size']} documents")
+        for path, lower_is_better in COMPARED:
+            before, after = lookup(old, path), lookup(r, path)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            worse = ratio > 1.1 if lower_is_better else ratio < 1 / 1.1
+            print(f"  {path:<26}{before:>12.2f}{after:>12.2f}{ratio:>8.2f}x{'  !' if worse else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--queries', default=os.path.join(ROOT, 'bench', 'queries.jsonl'))
+    parser.add_argument('--repeat', type=int, default=5, help="passes over the query log")
+    parser.add_argument('--threads', type=int, default=4, help="threads for the throughput runs")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="simulated LLM seconds per answer")
+    parser.add_argument('--output', help="results file (default bench/results/e2e-<commit>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--verbose', action='store_true', help="show the engine's output")
+    # Used by the child processes
+    parser.add_argument('--phase', choices=['build', 'serve'], help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase(args)
+        return
+
+    commit, dirty = git_commit()
+    results = []
+    for n_docs in args.sizes:
+        print(f"Measuring {n_docs} documents...", flush=True)
+        results.append(measure(n_docs, args))
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(
+        ROOT, 'bench', 'results', f"e2e-{commit or 'unknown'}{'-dirty' if dirty else ''}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'commit': commit,
+                'dirty': dirty,
+                'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'queries': os.path.relpath(args.queries, ROOT),
+                'repeat': args.repeat,
+                'threads': args.threads,
+                'stub_latency': args.stub_latency,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# bench/embedding_layouts.py
+"""Compare memory use and query latency of dense vs sparse CSR embedding layouts.
+
+Run from the repository root:
+
+    python bench/embedding_layouts.py [--docs 4000] [--vocab 40000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.sparse_store import SparseEmbeddingStore  # noqa: E402
+
+
+def score(matrix, query_vector):
+    """Cosine similarity of one L2-normalized query row against every stored row"""
+    query_vector = sparse.csr_matrix(query_vector, dtype=np.float32)
+    return (matrix @ query_vector.T).toarray().ravel()
+
+
+def bundled_texts():
+    """Document contents from the bundled knowledge base"""
+    with open(os.path.join('data', 'university_data.json'), encoding='utf-8') as f:
+        return [doc['content'] for doc in json.load(f)['documents']]
+
+
+def synthetic_texts(n_docs, vocab_size, words_per_doc=1000, seed=0):
+    """Zipf-distributed documents, roughly shaped like PDF chunks"""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"term{i}" for i in range(vocab_size)])
+    ranks = np.minimum(rng.zipf(1.2, size=(n_docs, words_per_doc)), vocab_size) - 1
+    return [" ".join(vocab[row]) for row in ranks]
+
+
+def measure(name, texts, n_queries):
+    vectorizer = TfidfVectorizer()
+    tfidf = vectorizer.fit_transform(texts)
+    dense = tfidf.toarray()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dense_path = os.path.join(tmp, 'dense.npz')
+        sparse_path = os.path.join(tmp, 'sparse.npz')
+        np.savez(dense_path, embeddings=dense)
+        store = SparseEmbeddingStore(sparse_path)
+        matrix = store.save(tfidf).embeddings
+        dense_file = os.path.getsize(dense_path)
+        generation = os.path.join(store.index_dir, store.generation)
+        # Row arrays only; the generation also holds the postings
+        sparse_file = sum(
+            os.path.getsize(os.path.join(generation, name)) for name in ('data.npy', 'indices.npy', 'indptr.npy')
+        )
+
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(texts[i % len(texts)].split(), size=4)) for i in range(n_queries)]
+    query_vectors = [vectorizer.transform([q]) for q in queries]
+
+    start = time.perf_counter()
+    for q in query_vectors:
+        cosine_similarity(q.toarray(), dense)[0]
+    dense_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    start = time.perf_counter()
+    for q in query_vectors:
+        score(matrix, q)
+    sparse_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    sparse_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    print(f"\n{name}: {dense.shape[0]} docs x {dense.shape[1]} terms, density {tfidf.nnz / dense.size:.4%}")
+    print(f"  {'layout':<8}{'memory':>12}{'file':>12}{'query':>12}")
+    print(f"  {'dense':<8}{dense.nbytes / 2**20:>10.1f}MB{dense_file / 2**20:>10.1f}MB{dense_ms:>10.3f}ms")
+    print(f"  {'sparse':<8}{sparse_bytes / 2**20:>10.1f}MB{sparse_file / 2**20:>10.1f}MB{sparse_ms:>10.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=4000)
+    parser.add_argument('--vocab', type=int, default=40000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    measure('bundled corpus', bundled_texts(), args.queries)
+    measure('synthetic corpus', synthetic_texts(args.docs, args.vocab), args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# bench/load_test.py
+"""Load test the chat endpoint under gunicorn, comparing serving modes.
+
+Starts gunicorn on a scratch copy of the app for each serving mode, with the
+stub LLM backend (LLM_STUB_LATENCY simulates the Gemini round trip) and the
+answer cache off. Then N simulated users each hold a session and post
+questions from a JSONL query log back to back. Run from the repository root:
+
+    python bench/load_test.py [--modes sync threaded] [--users 4 16 32] [--duration 15]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+COPIED = ['app', 'data', 'embeddings_db', 'config.py', 'run.py', 'gunicorn.conf.py']
+
+
+def load_queries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['query'] for line in f if line.strip()]
+
+
+def scratch_copy(tmp):
+    """Copy the app so servers don't write sessions or databases into the working tree"""
+    for name in COPIED:
+        source = os.path.join(ROOT, name)
+        target = os.path.join(tmp, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, ignore=shutil.ignore_patterns('__pycache__', 'flask_session'))
+        else:
+            shutil.copy(source, target)
+    return tmp
+
+
+def start_server(app_dir, mode, port, workers, threads, stub_latency):
+    env = dict(
+        os.environ,
+        SERVING_MODE=mode,
+        GUNICORN_THREADS=str(threads),
+        WEB_CONCURRENCY=str(workers),
+        LLM_BACKEND='stub',
+        LLM_STUB_LATENCY=str(stub_latency),
+        ANSWER_CACHE_SIZE='0',
+        SECRET_KEY='load-test',
+        PYTHONWARNINGS='ignore',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', 'run:app'],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}/'
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return server, url
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"gunicorn ({mode}) did not start")
+
+
+def user(url, queries, offset, stop_at, latencies, errors):
+    """One browser tab: a session cookie and questions posted back to back"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(url, timeout=30).read()
+    i = offset
+    while time.monotonic() < stop_at:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps({'user_input': queries[i % len(queries)]}).encode(),
+            headers={'Content-Type': 'application/json', 'Referer': url},
+        )
+        start = time.monotonic()
+        try:
+            opener.open(request, timeout=120).read()
+            latencies.append(time.monotonic() - start)
+        except OSError:
+            errors.append(time.monotonic() - start)
+        i += 1
+
+
+def run(url, queries, users, duration):
+    latencies, errors = [], []
+    stop_at = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=user, args=(url, queries, n, stop_at, latencies, errors))
+        for n in range(users)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        'p95_ms': float(np.percentile(latencies, 95) * 1000) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'threaded'])
+    parser.add_argument('--users', type=int, nargs='+', default=[4, 16, 32])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stub-latency', type=float, default=0.5)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--queries', default=os.path.join(os.path.dirname(__file__), 'queries.jsonl'))
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    print(f"{args.workers} workers, stub LLM latency {args.stub_latency}s, {args.duration}s per run")
+    print(f"{'mode':<10}{'users':>6}{'req/s':>9}{'p50':>10}{'p95':>10}{'errors':>8}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            server, url = start_server(
+                scratch_copy(tmp), mode, args.port, args.workers, args.threads, args.stub_latency
+            )
+            try:
+                for users in args.users:
+                    r = run(url, queries, users, args.duration)
+                    print(f"{mode:<10}{users:>6}{r['throughput']:>9.1f}"
+                          f"{r['p50_ms'] or 0:>8.0f}ms{r['p95_ms'] or 0:>8.0f}ms{r['errors']:>8}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# bench/retrieval.py
+"""Compare full-scan scoring against the inverted-index top-k search, per query and batched.
+
+Replays a JSONL query log (one {"query": ...} object per line) against
+synthetic corpora of chunk-sized documents built over the bundled vocabulary.
+Run from the repository root:
+
+    python bench/retrieval.py [--sizes 1000 10000 100000] [--queries bench/queries.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.sparse_store import SparseEmbeddingStore  # noqa: E402
+from app.backend.retrievers import restore_vectorizer  # noqa: E402
+from app.backend.retrieval import InvertedIndex  # noqa: E402
+from embedding_layouts import bundled_texts, score  # noqa: E402
+
+TOP_K = 5
+THRESHOLD = 0.1
+
+
+def load_queries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['query'] for line in f if line.strip()]
+
+
+def synthetic_corpus(n_docs, vocab_size=50000, words_per_doc=300, seed=0):
+    """TF-IDF matrix and vectorizer of Zipf-distributed chunks.
+
+    The most frequent ranks are the bundled corpus terms, ordered by how often
+    they occur there, so real queries hit realistic posting lists.
+    """
+    counts = TfidfVectorizer(use_idf=False, norm=None).fit(bundled_texts())
+    term_counts = np.asarray(counts.transform(bundled_texts()).sum(axis=0)).ravel()
+    real_terms = np.array(counts.get_feature_names_out())[np.argsort(-term_counts)]
+    filler = [f"term{i}" for i in range(max(vocab_size - len(real_terms), 0))]
+    terms = np.concatenate([real_terms, filler])
+
+    rng = np.random.default_rng(seed)
+    batches = []
+    for start in range(0, n_docs, 10000):
+        batch = min(10000, n_docs - start)
+        ranks = np.minimum(rng.zipf(1.2, size=(batch, words_per_doc)), len(terms)) - 1
+        rows = np.repeat(np.arange(batch), words_per_doc)
+        batches.append(sparse.csr_matrix(
+            (np.ones(rows.size, dtype=np.float32), (rows, ranks.ravel())), shape=(batch, len(terms))
+        ))
+    tf = sparse.vstack(batches, format='csr')
+    transformer = TfidfTransformer().fit(tf)
+    matrix = SparseEmbeddingStore.prepare(transformer.transform(tf))
+    return matrix, restore_vectorizer(terms, transformer.idf_)
+
+
+def full_scan(matrix, query_vector, tombstones):
+    """The previous search: score every row, argsort everything, then threshold"""
+    similarities = score(matrix, query_vector)
+    similarities[tombstones] = 0.0
+    top = similarities.argsort()[-TOP_K:][::-1]
+    return [row for row in top if similarities[row] > THRESHOLD]
+
+
+def measure(n_docs, queries, repeat):
+    start = time.perf_counter()
+    matrix, vectorizer = synthetic_corpus(n_docs)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    postings = InvertedIndex.build(matrix)
+    postings_s = time.perf_counter() - start
+
+    tombstones = np.zeros(matrix.shape[0], dtype=bool)
+    query_vectors = [vectorizer.transform([q]) for q in queries]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        expected = [full_scan(matrix, q, tombstones) for q in query_vectors]
+    scan_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = [postings.search(q, TOP_K, THRESHOLD, tombstones)[0] for q in query_vectors]
+    inverted_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    query_matrix = vectorizer.transform(queries)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        batched = [rows for rows, _ in postings.search_batch(query_matrix, TOP_K, THRESHOLD, tombstones)]
+    batch_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    # Ties may be ordered differently, so compare result sets
+    agree = sum(
+        set(map(int, a)) == set(map(int, b)) == set(map(int, c)) for a, b, c in zip(expected, found, batched)
+    )
+    hits = sum(len(rows) > 0 for rows in found)
+    print(f"\n{n_docs} chunks x {matrix.shape[1]} terms, nnz {matrix.nnz} "
+          f"(corpus {build_s:.1f}s, postings {postings_s * 1000:.0f}ms)")
+    print(f"  full scan + argsort   {scan_ms:>8.3f}ms/query")
+    print(f"  inverted + partition  {inverted_ms:>8.3f}ms/query  ({scan_ms / inverted_ms:.1f}x)")
+    print(f"  inverted, one batch   {batch_ms:>8.3f}ms/query  ({scan_ms / batch_ms:.1f}x)")
+    print(f"  same top-{TOP_K}: {agree}/{len(queries)} queries, {hits} with hits above {THRESHOLD}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', default=os.path.join(os.path.dirname(__file__), 'queries.jsonl'))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    print(f"Replaying {len(queries)} queries x {args.repeat}")
+    for n_docs in args.sizes:
+        measure(n_docs, queries, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# bench/retrievers.py
+"""Compare the retrieval backends (TF-IDF cosine, BM25) on answer quality and latency.
+
+Quality: labeled questions are searched against the bundled knowledge base
+(data/university_data.json, the 1000-word PDF chunks the app indexes by
+default) and against the PDFs split by the structure-aware chunker. A
+question counts as answered at k if its answer passage is in the top k hits
+above the backend's threshold; MRR uses the first such hit. Small talk and
+off-topic questions should find nothing above the threshold, so the prompt
+says there is no university data instead of quoting unrelated chunks.
+
+Latency: build time, index size and per-query search time (queries one at a
+time and as one batch) over synthetic corpora of university-like chunks,
+replaying a JSONL query log. Run from the repository root:
+
+    python bench/retrievers.py [--sizes 10000 50000] [--bm25 1.2:0.75 1.2:0.9]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.ingestion import PDFTextExtractor  # noqa: E402
+from app.backend.chunking import structured_chunks  # noqa: E402
+from app.backend.retrieval import InvertedIndex  # noqa: E402
+from app.backend.retrievers import BM25Retriever, TfidfRetriever  # noqa: E402
+from app.backend.sparse_store import SparseEmbeddingStore  # noqa: E402
+from chunking import load_questions, squash  # noqa: E402
+from e2e import synthetic_corpus  # noqa: E402
+
+TOP_K = 5
+
+OFF_TOPIC = [
+    "hello how are you", "what is the", "who are you", "tell me a joke", "thanks a lot",
+    "what is the weather in paris today", "can you help me", "what time is it now",
+]
+
+
+def backends(bm25_params):
+    """(label, factory) for TF-IDF and each BM25 k1:b setting"""
+    configured = [('tfidf', TfidfRetriever)]
+    for params in bm25_params:
+        k1, b = (float(value) for value in params.split(':'))
+        configured.append((f"bm25 k1={k1:g} b={b:g}", lambda k1=k1, b=b: BM25Retriever(k1, b)))
+    return configured
+
+
+def build(retriever, texts):
+    start = time.perf_counter()
+    matrix = SparseEmbeddingStore.prepare(retriever.fit_transform(texts))
+    index = InvertedIndex.build(matrix)
+    return matrix, index, time.perf_counter() - start
+
+
+def quality(label, factory, texts, questions):
+    retriever = factory()
+    _, index, _ = build(retriever, texts)
+    results = index.search_batch(retriever.transform_queries([q['query'] for q in questions]), TOP_K, retriever.threshold)
+    off_topic = index.search_batch(retriever.transform_queries(OFF_TOPIC), TOP_K, retriever.threshold)
+
+    squashed = [squash(text) for text in texts]
+    hits = {1: 0, 3: 0, 5: 0}
+    reciprocal_rank = 0.0
+    unanswered = 0
+    for question, (rows, _) in zip(questions, results):
+        answer = squash(question['answer'])
+        found = [i for i, row in enumerate(rows) if answer in squashed[row]]
+        for k in hits:
+            hits[k] += bool(found) and found[0] < k
+        reciprocal_rank += 1 / (found[0] + 1) if found else 0.0
+        unanswered += len(rows) == 0
+    n = len(questions)
+    print(f"  {label:<24}{hits[1] / n:>7.0%}{hits[3] / n:>7.0%}{hits[5] / n:>7.0%}"
+          f"{reciprocal_rank / n:>7.2f}{unanswered:>9}{sum(len(rows) > 0 for rows, _ in off_topic):>8}/{len(OFF_TOPIC)}")
+
+
+def latency(label, factory, texts, queries, repeat):
+    retriever = factory()
+    matrix, index, build_s = build(retriever, texts)
+    index_mb = sum(a.nbytes for a in (index.postings.data, index.postings.indices, index.postings.indptr)) / 2 ** 20
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            index.search_batch(retriever.transform_queries([query]), TOP_K, retriever.threshold)
+    single_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = index.search_batch(retriever.transform_queries(queries), TOP_K, retriever.threshold)
+    batch_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    with_hits = sum(len(rows) > 0 for rows, _ in results)
+    print(f"  {label:<24}{build_s:>9.2f}{matrix.nnz:>11}{index_mb:>9.1f}{single_ms:>10.3f}{batch_ms:>10.3f}"
+          f"{with_hits:>6}/{len(queries)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', default=os.path.join('bench', 'pdf_questions.jsonl'))
+    parser.add_argument('--queries', default=os.path.join('bench', 'queries.jsonl'))
+    parser.add_argument('--pdfs', default=os.path.join('data', 'pdfs'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000], help="synthetic corpus sizes")
+    parser.add_argument('--bm25', nargs='+', default=['1.2:0.75'], help="BM25 k1:b settings to compare")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    configured = backends(args.bm25)
+    questions = load_questions(args.questions)
+    with open(os.path.join('data', 'university_data.json'), encoding='utf-8') as f:
+        stored = [doc['content'] for doc in json.load(f)['documents']]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        extractor = PDFTextExtractor(cache_dir)
+        structured = [
+            chunk['text']
+            for path in sorted(glob.glob(os.path.join(args.pdfs, '*.pdf')))
+            for chunk in structured_chunks(extractor.extract_pages(path))
+        ]
+
+    for name, texts in [("stored documents", stored), ("structured chunks", structured)]:
+        print(f"\nQuality on {name}: {len(texts)} chunks, {len(questions)} labeled questions")
+        print(f"  {'backend':<24}{'hit@1':>7}{'hit@3':>7}{'hit@5':>7}{'MRR':>7}{'no hits':>9}{'off-topic hits':>15}")
+        for label, factory in configured:
+            quality(label, factory, texts, questions)
+
+    queries = [json.loads(line)['query'] for line in open(args.queries, encoding='utf-8') if line.strip()]
+    for n_docs in args.sizes:
+        texts = [doc['content'] for doc in synthetic_corpus(n_docs)]
+        print(f"\nLatency on {n_docs} synthetic chunks, {len(queries)} queries x {args.repeat}")
+        print(f"  {'backend':<24}{'build s':>9}{'nnz':>11}{'MB':>9}{'ms/query':>10}{'batched':>10}{'hits':>11}")
+        for label, factory in configured:
+            latency(label, factory, texts, queries, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# bench/smoke.py
+"""Run every benchmark once on tiny inputs, so one that no longer matches the code fails here.
+
+Each bench runs in its own process with settings small enough to finish in
+seconds; only whether it completes is checked, not the numbers it prints.
+Exits non-zero if any bench fails. Run from the repository root:
+
+    python bench/smoke.py [--only retrieval dense] [--verbose]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Smallest settings that still exercise every code path of each bench
+BENCHES = {
+    'retrieval': ['--sizes', '200', '--repeat', '1'],
+    'embedding_layouts': ['--docs', '200', '--vocab', '2000', '--queries', '10'],
+    'startup': ['--sizes', '50', '--repeat', '1'],
+    'chunking': ['--sizes', '120'],
+    'retrievers': ['--sizes', '500', '--repeat', '1'],
+    'dense': ['--sizes', '500', '--thresholds', '0.3', '--nprobe', '4', '--ivf-min-rows', '100', '--repeat', '1'],
+    'e2e': ['--sizes', '100', '--repeat', '1', '--threads', '2'],
+    'concurrency': ['--readers', '2', '--duration', '1', '--refit-every', '2'],
+    'load_test': ['--modes', 'sync', '--users', '2', '--duration', '2', '--workers', '1', '--stub-latency', '0'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHES), help="benches to run (default all)")
+    parser.add_argument('--verbose', action='store_true', help="show each bench's output")
+    args = parser.parse_args()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or BENCHES:
+            command = [sys.executable, os.path.join('bench', f"{name}.py"), *BENCHES[name]]
+            if name == 'e2e':
+                # Keep the results file out of bench/results
+                command += ['--output', os.path.join(tmp, 'e2e.json')]
+            start = time.perf_counter()
+            run = subprocess.run(command, cwd=ROOT, capture_output=not args.verbose, text=True)
+            status = 'ok' if run.returncode == 0 else f"FAILED (exit {run.returncode})"
+            print(f"{name:<20}{status:<20}{time.perf_counter() - start:>7.1f}s")
+            if run.returncode != 0:
+                failed.append(name)
+                if not args.verbose:
+                    print('\n'.join(f"    {line}" for line in run.stderr.strip().splitlines()[-15:]))
+
+    if failed:
+        print(f"\n{len(failed)} of {len(args.only or BENCHES)} benches failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
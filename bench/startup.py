@@ -0,0 +1,76 @@
+# bench/startup.py
+"""Compare index start-up time: refitting the vectorizer vs loading the persisted one.
+
+The old path loaded the dense embeddings and then refit TfidfVectorizer over
+every document; the new path maps matrix, vocabulary and IDF weights from the
+store and only hashes the texts to check the fingerprint.
+
+Run from the repository root:
+
+    python bench/startup.py [--sizes 500 2000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.sparse_store import SparseEmbeddingStore, content_hash, document_digest, fingerprint  # noqa: E402
+from app.backend.retrievers import TfidfRetriever  # noqa: E402
+from embedding_layouts import bundled_texts, synthetic_texts  # noqa: E402
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def measure(name, texts, repeat):
+    retriever = TfidfRetriever()
+    matrix = retriever.fit_transform(texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dense_path = os.path.join(tmp, 'dense.npz')
+        np.savez(dense_path, embeddings=matrix.toarray())
+        store = SparseEmbeddingStore(os.path.join(tmp, 'sparse.npz'))
+        expected = fingerprint(document_digest(i, content_hash(text)) for i, text in enumerate(texts))
+        store.save(matrix, retriever, expected)
+
+        def old_path():
+            with np.load(dense_path) as loaded:
+                loaded['embeddings']
+            TfidfVectorizer().fit(texts)
+
+        def new_path():
+            stored = store.load()
+            assert stored.fingerprint == fingerprint(document_digest(i, content_hash(text)) for i, text in enumerate(texts))
+
+        old_ms = best_of(repeat, old_path)
+        new_ms = best_of(repeat, new_path)
+
+    print(f"{name:<24}{len(texts):>8}{old_ms:>12.1f}ms{new_ms:>12.1f}ms{old_ms / new_ms:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'corpus':<24}{'docs':>8}{'refit':>14}{'persisted':>14}{'speedup':>10}")
+    measure('bundled', bundled_texts(), args.repeat)
+    for size in args.sizes:
+        measure('synthetic', synthetic_texts(size, 40000), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
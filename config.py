@@ -14,3 +14,110 @@ def check_password(password):
     """Check if the provided password matches the stored hash"""
     password_hash = hashlib.sha256(password.encode()).hexdigest()
     return password_hash == ADMIN_PASSWORD_HASH
+
+# Document storage backend: "sqlite" (WAL mode, imports university_data.json once) or "json"
+DOCUMENT_STORE = os.getenv("DOCUMENT_STORE", "sqlite")
+
+# Worker processes for page-parallel PDF text extraction (defaults to the CPU count)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or None
+
+# Incremental indexing: admin edits append/tombstone rows instead of rebuilding the index.
+# A background refit runs once vocabulary drift or the tombstoned share passes its threshold.
+INCREMENTAL_INDEXING = os.getenv("INCREMENTAL_INDEXING", "true").lower() == "true"
+INDEX_DRIFT_THRESHOLD = float(os.getenv("INDEX_DRIFT_THRESHOLD", "0.1"))
+INDEX_TOMBSTONE_THRESHOLD = float(os.getenv("INDEX_TOMBSTONE_THRESHOLD", "0.2"))
+
+# Retrieval cache: search results per normalized query, dropped whenever the index changes.
+# Size 0 disables it; TTL is in seconds (0 = no expiry)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")) or None
+
+# Answer cache: LLM answers to standalone questions, keyed by the question's content words
+# and the exact documents retrieved for it. Size 0 disables it; TTL is in seconds (0 = no expiry)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600")) or None
+
+# LLM client: "gemini" or "stub" (offline answers built from the prompt, for tests and load tests).
+# LLM_TIMEOUT is the deadline for a whole call including retries; each attempt gets at most
+# LLM_ATTEMPT_TIMEOUT. The circuit opens after LLM_BREAKER_THRESHOLD consecutive failures
+# and lets a trial call through after LLM_BREAKER_RESET seconds
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "25"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0"))
+
+# Serving mode for gunicorn (see gunicorn.conf.py): "threaded" serves each worker's requests
+# from GUNICORN_THREADS threads so requests waiting on the LLM don't hold the whole worker;
+# "sync" is one request at a time per worker
+SERVING_MODE = os.getenv("SERVING_MODE", "threaded")
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# When the RAG engine (index, documents, LLM client) is built: "background" starts building it
+# on a thread as soon as the app is created, "lazy" waits for the first request that needs it,
+# "preload" builds it before create_app returns and makes gunicorn load the app in the master
+# (preload_app), so the index is loaded once and shared by the forked workers
+ENGINE_WARMUP = os.getenv("ENGINE_WARMUP", "background")
+
+# Prompt size limits, in estimated tokens: retrieved passages are trimmed to the sentences
+# relevant to the question (plus CONTEXT_SENTENCE_WINDOW neighbours each side) and packed
+# best first up to CONTEXT_TOKEN_BUDGET; recent turns fill HISTORY_TOKEN_BUDGET newest first
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CONTEXT_SENTENCE_WINDOW = int(os.getenv("CONTEXT_SENTENCE_WINDOW", "1"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+
+# How PDFs are split into chunks: "structured" packs whole sentences, clauses and headings into
+# chunks of up to CHUNK_MAX_WORDS words, starting a new chunk at a heading or numbered section
+# once the current one has CHUNK_MIN_WORDS; "words" is the original 1000-word windows with a
+# 200-word overlap. Only PDFs ingested after a change are chunked the new way
+CHUNKER = os.getenv("CHUNKER", "structured")
+CHUNK_MAX_WORDS = int(os.getenv("CHUNK_MAX_WORDS", "200"))
+CHUNK_MIN_WORDS = int(os.getenv("CHUNK_MIN_WORDS", "40"))
+
+# Where chat history lives: "sqlite" (CONVERSATION_DB, shared by all workers), "memory" (per
+# process, single-worker deployments only) or "session" (inside the Flask session, as before).
+# Each conversation keeps its last CONVERSATION_MAX_TURNS turns, as raw text without the
+# rendered HTML, and is removed after CONVERSATION_TTL idle seconds (checked every
+# CONVERSATION_GC_INTERVAL seconds)
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "flask_session/conversations.db")
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "10"))
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "86400"))
+CONVERSATION_GC_INTERVAL = float(os.getenv("CONVERSATION_GC_INTERVAL", "300"))
+
+# Rendered (sanitized HTML) bot messages cached by content hash
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "1024"))
+
+# Request tracing: every request's total and per-stage times (search, context, llm, render,
+# session_save) go into histograms served at /metrics. Set TRACE_LOG to a file path to also
+# append one JSON line per request with those timings and its cache and retrieval outcomes
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+
+# Lexical scoring backend: "tfidf" (cosine similarity of TF-IDF vectors) or "bm25" (Okapi BM25
+# with term-frequency saturation BM25_K1 and length normalization BM25_B, scored relative to a
+# full match on a rare term). Hits scoring below RETRIEVAL_THRESHOLD are dropped; empty uses the
+# backend's default (0.1 for tfidf, 0.5 for bm25). Changing the backend refits the index
+RETRIEVER = os.getenv("RETRIEVER", "tfidf")
+RETRIEVAL_THRESHOLD = float(os.getenv("RETRIEVAL_THRESHOLD", "0") or 0) or None
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Optional dense retrieval next to the lexical index, merged with its hits by reciprocal rank
+# fusion: "" (off), "lsa" (TF-IDF projected onto DENSE_DIMENSIONS latent topics, fitted on the
+# corpus) or "sentence-transformers" (the model in the local directory DENSE_MODEL, run on the
+# CPU; needs the sentence-transformers package). Chunks are encoded DENSE_BATCH_SIZE at a time
+# and their vectors cached by content hash, so unchanged chunks are never encoded twice
+DENSE_ENCODER = os.getenv("DENSE_ENCODER", "")
+DENSE_MODEL = os.getenv("DENSE_MODEL", "")
+DENSE_DIMENSIONS = int(os.getenv("DENSE_DIMENSIONS", "256"))
+DENSE_BATCH_SIZE = int(os.getenv("DENSE_BATCH_SIZE", "64"))
+# Lowest cosine similarity counted as a dense hit
+DENSE_THRESHOLD = float(os.getenv("DENSE_THRESHOLD", "0.3"))
+# Corpora of at least DENSE_IVF_MIN_ROWS chunks are clustered into about sqrt(chunks) lists and
+# a query scans its DENSE_NPROBE closest lists; smaller ones are searched exhaustively
+DENSE_IVF_MIN_ROWS = int(os.getenv("DENSE_IVF_MIN_ROWS", "2000"))
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", "16"))
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+"""Gunicorn settings, picked up automatically by `gunicorn run:app`.
+
+The chat path spends most of its time waiting on the LLM. In the default
+"threaded" mode each worker serves requests from a thread pool, so that wait
+no longer caps throughput at the worker count; CPU work (retrieval, markdown)
+still runs in parallel across workers. Workers and bind address keep gunicorn's
+defaults ($WEB_CONCURRENCY, $PORT).
+
+With ENGINE_WARMUP=preload the app, and with it the RAG engine, is loaded once
+in the master before the workers fork; the memory-mapped index pages are then
+shared by every worker instead of each worker loading its own copy.
+"""
+import sys
+from config import SERVING_MODE, GUNICORN_THREADS, ENGINE_WARMUP
+
+if SERVING_MODE == 'threaded':
+    worker_class = 'gthread'
+    threads = GUNICORN_THREADS
+elif SERVING_MODE == 'sync':
+    worker_class = 'sync'
+else:
+    raise ValueError(f"Unknown SERVING_MODE: {SERVING_MODE}")
+
+# Above LLM_TIMEOUT, so a sync worker waiting out a slow answer isn't killed
+timeout = 120
+
+# Build the engine in the master before forking (same as passing --preload)
+preload_app = ENGINE_WARMUP == 'preload'
+
+
+def pre_fork(server, worker):
+    # With --preload and a background warm-up the master may still be building the
+    # engine; let it finish so workers don't inherit half-imported modules
+    routes = sys.modules.get('app.backend.routes')
+    if routes is not None:
+        routes.engine_registry.wait()
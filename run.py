@@ -1,6 +1,8 @@
 from app.backend import create_app
 
-app = create_app()
+# Spawned PDF extraction processes import this module as __mp_main__ and don't need the app
+if __name__ != '__mp_main__':
+    app = create_app()
 
 
 